@@ -1,22 +1,25 @@
+import argparse
 import json
 import time
 
-import subprocess
-import shutil
-
 import cv2
 import os
 import glob
-import numpy as np
-from matplotlib import colormaps, pyplot as plt
+from matplotlib import colormaps
 
-from map import main as map_main
+from fan_out import fan_out
+from frame_cache import get_frame_cache, render_settings_hash, frame_key, start_run
+from frame_compositor import get_compositor
+from history_store import load_history
+import interpolation
+from parallel_render import ordered_map
+from video_encoder import VideoEncoder
 
 from constants import (
     DAILY_MAPS_DIR, FINAL_VIDEOS_DIR, TRANSITION_FRAMES_DIR,
     TRANSITION_POLLING_RESULTS_DIR, TRANSITION_VISUALS_DIR, TRANSITION_ELECTORAL_COUNTS_DIR, HOLD_FRAME_COUNT,
-    TRANSITION_FRAME_COUNT, POLLING_RESULTS_DIR, ELECTORAL_VOTE_COUNTS_DIR, ANIMATE_LAST_N_ONLY,
-    GOOGLE_DRIVE_UPLOAD_PATH, SAVE_TO_GOOGLE_DRIVE
+    TRANSITION_FRAME_COUNT, ANIMATE_LAST_N_ONLY, SAVE_TRANSITION_FRAMES, RENDER_WORKERS, RENDER_MAX_FRAMES_IN_FLIGHT,
+    MAP_VIDEO_FPS, TRANSITION_EASING
 )
 
 
@@ -25,28 +28,8 @@ cmap_b = colormaps['Blues']
 
 map_color_maps = (cmap_r, cmap_b)
 
-# Get a list of all the image files
-image_files = glob.glob(f'{DAILY_MAPS_DIR}/*.png')
-image_files.sort()  # Sort the files
-
-if ANIMATE_LAST_N_ONLY:
-    image_files = image_files[-ANIMATE_LAST_N_ONLY:]  # Only use the last N days
-
-# Get the size of the first image
-img = cv2.imread(image_files[0])
-height, width, layers = img.shape
-size = (width, height)
-
-date1_overall = image_files[0].split('_')[-1].split('.')[0]
-date2_overall = image_files[-1].split('_')[-1].split('.')[0]
 
-# Initialize the video writer
-os.makedirs(FINAL_VIDEOS_DIR, exist_ok=True)
-video = cv2.VideoWriter(f'{FINAL_VIDEOS_DIR}/maps/{date1_overall}_to_{date2_overall}_map.avi', cv2.VideoWriter_fourcc(*'DIVX'), 30,
-                        size)
-
-
-def create_transition_frames(count, from_date, to_date, cms):
+def clear_transition_frames_dirs():
     # Create the directories if they don't exist
     os.makedirs(TRANSITION_FRAMES_DIR, exist_ok=True)
     os.makedirs(TRANSITION_POLLING_RESULTS_DIR, exist_ok=True)
@@ -61,144 +44,115 @@ def create_transition_frames(count, from_date, to_date, cms):
     for f in glob.glob(f'{TRANSITION_ELECTORAL_COUNTS_DIR}/*.json'):
         os.remove(f)
 
-    from_polling_result = os.path.join(POLLING_RESULTS_DIR, f'polling_results_{from_date}.json')
-    to_polling_result = os.path.join(POLLING_RESULTS_DIR, f'polling_results_{to_date}.json')
-
-    from_elec_votes = os.path.join(ELECTORAL_VOTE_COUNTS_DIR, f'electoral_votes_{from_date}.json')
-    to_elec_votes = os.path.join(ELECTORAL_VOTE_COUNTS_DIR, f'electoral_votes_{to_date}.json')
-
-    with open(from_polling_result) as f:
-        from_polling_results = json.load(f)
-    with open(to_polling_result) as f:
-        to_polling_results = json.load(f)
-
-    with open(from_elec_votes) as f:
-        from_elec_votes = json.load(f)
-    with open(to_elec_votes) as f:
-        to_elec_votes = json.load(f)
-
-    # create fake polling results for the transition
-    for alpha in np.linspace(0, 1, count):
-        if from_polling_results == to_polling_results:
-            transition_polling_results = from_polling_results
-        else:
-            transition_polling_results = {}
-            for state in from_polling_results:
-
-                from_winner = from_polling_results[state]['winner']
-                from_point_diff = from_polling_results[state]['point_diff']
-                to_winner = to_polling_results[state]['winner']
-                to_point_diff = to_polling_results[state]['point_diff']
-
-                if from_winner == to_winner:
-                    if from_point_diff == to_point_diff:
-                        transition_polling_results[state] = {
-                            "winner": from_winner,
-                            "point_diff": from_point_diff
-                        }
-                    else:
-                        transition_polling_results[state] = {
-                            "winner": from_winner,
-                            "point_diff": from_point_diff * (1 - alpha) + to_point_diff * alpha,
-                        }
-                else:
-                    if alpha < 0.5:
-                        transition_polling_results[state] = {
-                            "winner": from_winner,
-                            "point_diff": from_point_diff * (0.5 - alpha) / 0.5
-                        }
-                    else:
-                        transition_polling_results[state] = {
-                            "winner": to_winner,
-                            "point_diff": to_point_diff * (alpha - 0.5) / 0.5
-                        }
-
-        trump_from_elec_votes = from_elec_votes['Trump']
-        harris_from_elec_votes = from_elec_votes['Harris']
-        trump_to_elec_votes = to_elec_votes['Trump']
-        harris_to_elec_votes = to_elec_votes['Harris']
-
-        if trump_from_elec_votes == trump_to_elec_votes and harris_from_elec_votes == harris_to_elec_votes:
-            transition_elec_votes = {
-                "Trump": trump_from_elec_votes,
-                "Harris": harris_from_elec_votes
-            }
-        else:
-            transition_elec_votes = {
-                "Trump": trump_from_elec_votes * (1 - alpha) + trump_to_elec_votes * alpha,
-                "Harris": harris_from_elec_votes * (1 - alpha) + harris_to_elec_votes * alpha
-            }
-
-        # save the transition electoral vote counts
-        with open(os.path.join(TRANSITION_ELECTORAL_COUNTS_DIR, f'electoral_votes_{int(alpha * 100)}_{from_date}.json'),
-                  'w') as f:
-            json.dump(transition_elec_votes, f)
-
-        # save the transition polling results
-        with open(os.path.join(TRANSITION_POLLING_RESULTS_DIR, f'polling_results_{int(alpha * 100)}_{from_date}.json'),
-                  'w') as f:
-            json.dump(transition_polling_results, f)
-
-    # create the transition frames
-    figs_with_names = map_main(TRANSITION_POLLING_RESULTS_DIR, TRANSITION_ELECTORAL_COUNTS_DIR,
-                               [TRANSITION_VISUALS_DIR],
-                               color_maps=cms, return_not_save=True)
-
-    for fig, name in figs_with_names:
-        fig.savefig(os.path.join(TRANSITION_VISUALS_DIR, name))
-        plt.close(fig)
-
-
-# Loop through each pair of consecutive image files
-for i in range(len(image_files) - 1):
-    print(f'Creating transition frames for {image_files[i]} to {image_files[i + 1]}')
-    img1 = cv2.imread(image_files[i])
-    img2 = cv2.imread(image_files[i + 1])
-    img1 = cv2.resize(img1, size)  # Resize the image
-    img2 = cv2.resize(img2, size)  # Resize the image
-
-    # Write the first image multiple times
-    for _ in range(HOLD_FRAME_COUNT):
-        video.write(img1)
-
-    time.sleep(2)
-
-    date1 = image_files[i].split('_')[-1].split('.')[0]
-    date2 = image_files[i + 1].split('_')[-1].split('.')[0]
-
-    create_transition_frames(TRANSITION_FRAME_COUNT, date1, date2, map_color_maps)
-    final_image_files = glob.glob(f'{TRANSITION_VISUALS_DIR}/*.png')
-
-
-    def sort_key(f):
-        return int(f.split('_')[-2])
-
-
-    final_image_files.sort(key=sort_key)  # Sort the files
-    # print("sorted order of final_image_files:")
-    for file in final_image_files:
-        # print(file)
-        img = cv2.imread(file)
-        video.write(img)
-
-# Write the last image multiple times
-img = cv2.imread(image_files[-1])
-img = cv2.resize(img, size)  # Resize the image
-for _ in range(HOLD_FRAME_COUNT):  # Show the last image for one second
-    video.write(img)
-
-print("Rendering video...")
-# Release the video writer
-video.release()
-
-# Convert to mp4 using ffmpeg
-subprocess.run(['C:\\Users\\philh\\ffmpeg\\bin\\ffmpeg.exe', '-i', f'{FINAL_VIDEOS_DIR}/maps/{date1_overall}_to_{date2_overall}_map.avi', f'{FINAL_VIDEOS_DIR}/maps/{date1_overall}_to_{date2_overall}_map.mp4'])
-
-# Remove the .avi file
-os.remove(f'{FINAL_VIDEOS_DIR}/maps/{date1_overall}_to_{date2_overall}_map.avi')
-
-if SAVE_TO_GOOGLE_DRIVE:
-    print("Uploading video to Google Drive...")
-    # Copy the .mp4 file to Google Drive upload path
-    shutil.copy(f'{FINAL_VIDEOS_DIR}/maps/{date1_overall}_to_{date2_overall}_map.mp4', f'{GOOGLE_DRIVE_UPLOAD_PATH}/{date1_overall}_to_{date2_overall}_map.mp4')
-print("Done!")
+
+# Save one transition step as animate_map.py used to, for looking at in TRANSITION_FRAMES_DIR when debugging
+def save_transition_frame(alpha, from_date, polling_results, elec_votes, frame):
+    name = f'{int(alpha * 100)}_{from_date}'
+    with open(os.path.join(TRANSITION_ELECTORAL_COUNTS_DIR, f'electoral_votes_{name}.json'), 'w') as f:
+        json.dump(elec_votes, f)
+    with open(os.path.join(TRANSITION_POLLING_RESULTS_DIR, f'polling_results_{name}.json'), 'w') as f:
+        json.dump(polling_results, f)
+    cv2.imwrite(os.path.join(TRANSITION_VISUALS_DIR, f'polling_results_{name}.png'), frame)
+
+
+# Yield the transition frames from one day to the next as BGR arrays of the given size, ready for the video writer.
+# steps: the interpolation.InterpolatedDays for the transition. Frames drawn before, in this run or an earlier one, come
+# from the frame cache.
+def create_transition_frames(steps, from_date, cms, size, save_frames=False):
+    cache = get_frame_cache()
+    settings_hash = render_settings_hash(cms, size)
+    previous_key = frame = None
+    for i in range(len(steps)):
+        polling_results, elec_votes = steps.polling_results(i), steps.electoral_votes(i)
+        # transition frames are titled with the day they start from
+        key = frame_key(settings_hash, polling_results, elec_votes, from_date)
+        # a step that looks just like the last one (every step, when nothing changed) reuses its frame
+        if key != previous_key:
+            frame = cache.get(key)
+            if frame is None:
+                frame = cv2.cvtColor(get_compositor(cms).compose(polling_results, elec_votes, from_date),
+                                     cv2.COLOR_RGBA2BGR)
+                if frame.shape[1::-1] != size:
+                    frame = cv2.resize(frame, size)
+                cache.put(key, frame)
+            previous_key = key
+        if save_frames:
+            save_transition_frame(steps.alphas[i], from_date, polling_results, elec_votes, frame)
+        yield frame
+
+
+# All the transition frames from one day to the next, as a list. Runs in a parallel_render worker when rendering in
+# parallel, each of which keeps its own compositor.
+def render_transition(task):
+    steps, from_date, cms, size, save_frames = task
+    return list(create_transition_frames(steps, from_date, cms, size, save_frames))
+
+
+def main(save_transition_frames=SAVE_TRANSITION_FRAMES, workers=RENDER_WORKERS, easing=TRANSITION_EASING):
+    history = load_history()
+
+    # Get a list of all the image files
+    image_files = glob.glob(f'{DAILY_MAPS_DIR}/*.png')
+    image_files.sort()  # Sort the files
+
+    if ANIMATE_LAST_N_ONLY:
+        image_files = image_files[-ANIMATE_LAST_N_ONLY:]  # Only use the last N days
+
+    # Get the size of the first image
+    img = cv2.imread(image_files[0])
+    height, width, layers = img.shape
+    size = (width, height)
+
+    date1_overall = image_files[0].split('_')[-1].split('.')[0]
+    date2_overall = image_files[-1].split('_')[-1].split('.')[0]
+
+    if save_transition_frames:
+        clear_transition_frames_dirs()
+
+    # Initialize the video writer
+    video = VideoEncoder(f'{FINAL_VIDEOS_DIR}/maps/{date1_overall}_to_{date2_overall}_map.mp4', size, MAP_VIDEO_FPS)
+
+    dates = [image_file.split('_')[-1].split('.')[0] for image_file in image_files]
+    # every step of every transition, worked out at once
+    steps = interpolation.transitions(history, dates, TRANSITION_FRAME_COUNT, easing)
+    tasks = ((steps[i], date1, map_color_maps, size, save_transition_frames) for i, date1 in enumerate(dates[:-1]))
+    transitions = ordered_map(render_transition, tasks, workers,
+                              RENDER_MAX_FRAMES_IN_FLIGHT // max(TRANSITION_FRAME_COUNT, 1),
+                              initializer=start_run, initargs=(time.time(),))
+
+    with video:
+        # Loop through each pair of consecutive image files
+        for i, transition_frames in enumerate(transitions):
+            print(f'Creating transition frames for {image_files[i]} to {image_files[i + 1]}')
+            img1 = cv2.imread(image_files[i])
+            img1 = cv2.resize(img1, size)  # Resize the image
+
+            # Write the first image multiple times
+            for _ in range(HOLD_FRAME_COUNT):
+                video.write(img1)
+
+            for frame in transition_frames:
+                video.write(frame)
+
+        # Write the last image multiple times
+        img = cv2.imread(image_files[-1])
+        img = cv2.resize(img, size)  # Resize the image
+        for _ in range(HOLD_FRAME_COUNT):  # Show the last image for one second
+            video.write(img)
+
+        print("Rendering video...")
+
+    # Copy the .mp4 file to Google Drive and anywhere else it should go
+    fan_out(video.path)
+    print("Done!")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Animate the daily maps into a video.')
+    parser.add_argument('--save-transition-frames', action='store_true', default=SAVE_TRANSITION_FRAMES,
+                        help=f'also write every transition frame and its results under {TRANSITION_FRAMES_DIR}')
+    parser.add_argument('--workers', type=int, default=RENDER_WORKERS, help='number of processes rendering frames')
+    parser.add_argument('--easing', choices=sorted(interpolation.EASINGS), default=TRANSITION_EASING,
+                        help='how the map moves from one day to the next')
+    args = parser.parse_args()
+    main(args.save_transition_frames, args.workers, args.easing)
@@ -0,0 +1,251 @@
+# an asyncio version of the data collection in simulate.py, built as four pipeline stages joined by queues:
+#
+#   fetch      load a state page in a pooled browser, throttled by a global token bucket and a per-host cap
+#   parse      read the poll rows out of the page (simulate.parse_poll_rows)
+#   aggregate  run the fallback ladder on the rows, sending the state back to fetch for Biden/Trump if needed
+#   persist    checkpoint each finished state, and write the day's results once every state is in
+#
+# Run with: python async_scrape.py [--workers N] [--rate R]
+
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+
+from selenium.common.exceptions import WebDriverException
+
+from checkpoint import StateCheckpoint
+from driver_pool import DriverPool
+from page_cache import save_snapshot
+from simulate import (
+    fix_state_name, load_state_page, parse_poll_rows, find_harris_winner, find_biden_winner, make_polling_result,
+    save_results
+)
+
+from constants import (
+    STATE_AND_THEIR_ELECTORAL_VOTES, POLLS_URL, SAVE_PAGE_SNAPSHOTS, SCRAPE_WORKERS, SCRAPE_MAX_ATTEMPTS,
+    SCRAPE_BACKOFF_SECONDS, SCRAPE_MAX_BACKOFF_SECONDS, SCRAPE_REQUESTS_PER_SECOND, SCRAPE_BURST,
+    SCRAPE_PER_HOST_CONCURRENCY, PIPELINE_QUEUE_SIZE
+)
+
+STAGES = ['wait', 'fetch', 'parse', 'aggregate', 'persist']
+
+
+# A token bucket shared by every fetch: holds up to burst tokens, refilled at rate tokens per second, and each page
+# load takes one
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# One semaphore per host, so no host ever has more than the given number of page loads in flight
+class HostLimiter:
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._semaphores = {}
+
+    def __call__(self, url):
+        host = urlparse(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.per_host)
+        return self._semaphores[host]
+
+
+class Pipeline:
+
+    def __init__(self, states, today, workers, rate, burst, per_host, checkpoint=None):
+        self.states = states
+        self.today = today
+        self.workers = workers
+        self.checkpoint = checkpoint
+
+        self.bucket = TokenBucket(rate, burst)
+        self.host_limiter = HostLimiter(per_host)
+        self.driver_pool = DriverPool(workers)
+        # page loads run in threads of their own, so a failed run can wait for them to finish before closing the pool
+        self.fetch_executor = ThreadPoolExecutor(workers, thread_name_prefix='fetch')
+
+        # the fetch queue holds at most two jobs per state, so it is left unbounded: aggregate can always hand a state
+        # back to it without blocking on the stages downstream of fetch
+        self.fetch_queue = asyncio.Queue()
+        self.parse_queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+        self.aggregate_queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+        self.persist_queue = asyncio.Queue(PIPELINE_QUEUE_SIZE)
+
+        self.polling_results = {}
+        self.timings = defaultdict(lambda: defaultdict(float))  # state -> stage -> seconds
+        self.finished = asyncio.Event()
+
+    # Load a state page in a pooled browser and return its HTML, run in a worker thread as selenium blocks
+    def _fetch_page(self, state, dem):
+        with self.driver_pool.checkout() as driver:
+            load_state_page(state, dem, driver)
+            html = driver.page_source
+        if SAVE_PAGE_SNAPSHOTS:
+            save_snapshot(state, self.today.isoformat(), f'{dem} trump'.lower(), html)
+        return html
+
+    async def fetch_worker(self):
+        while True:
+            state, dem = await self.fetch_queue.get()
+            url = f'{POLLS_URL}/{state}'
+            for attempt in range(1, SCRAPE_MAX_ATTEMPTS + 1):
+                wait_start = time.perf_counter()
+                await self.bucket.acquire()
+                async with self.host_limiter(url):
+                    fetch_start = time.perf_counter()
+                    self.timings[state]['wait'] += fetch_start - wait_start
+                    try:
+                        html = await asyncio.get_running_loop().run_in_executor(self.fetch_executor,
+                                                                                 self._fetch_page, state, dem)
+                    except WebDriverException as e:
+                        html = None
+                        error = e
+                    self.timings[state]['fetch'] += time.perf_counter() - fetch_start
+                if html is not None:
+                    break
+                if attempt == SCRAPE_MAX_ATTEMPTS:
+                    raise error
+                delay = min(SCRAPE_BACKOFF_SECONDS * 2 ** (attempt - 1), SCRAPE_MAX_BACKOFF_SECONDS)
+                print(f"{type(error).__name__} while fetching {fix_state_name(state)} (attempt {attempt} of "
+                      f"{SCRAPE_MAX_ATTEMPTS}). Trying again in {delay}s...")
+                await asyncio.sleep(delay)
+            await self.parse_queue.put((state, dem, html))
+            self.fetch_queue.task_done()
+
+    async def parse_worker(self):
+        while True:
+            state, dem, html = await self.parse_queue.get()
+            start = time.perf_counter()
+            rows = await asyncio.to_thread(parse_poll_rows, html, self.today)
+            self.timings[state]['parse'] += time.perf_counter() - start
+            await self.aggregate_queue.put((state, dem, rows))
+
+    async def aggregate_worker(self):
+        while True:
+            state, dem, rows = await self.aggregate_queue.get()
+            start = time.perf_counter()
+            if dem == 'Harris':
+                winner, pd = find_harris_winner(state, rows, self.today)
+                if not winner:
+                    print(f"Trying Biden instead of Harris for {fix_state_name(state)}, going back one year.")
+                    self.timings[state]['aggregate'] += time.perf_counter() - start
+                    self.fetch_queue.put_nowait((state, 'Biden'))
+                    continue
+                polling_result = make_polling_result(state, winner, pd)
+            else:
+                winner, pd = find_biden_winner(state, rows, self.today)
+                polling_result = make_polling_result(state, winner, pd, used_biden_2024_polling=bool(winner))
+            self.timings[state]['aggregate'] += time.perf_counter() - start
+            await self.persist_queue.put((state, polling_result))
+
+    async def persist_worker(self):
+        while True:
+            state, polling_result = await self.persist_queue.get()
+            start = time.perf_counter()
+            if self.checkpoint is not None:
+                await asyncio.to_thread(self.checkpoint.record, state, polling_result)
+            self.polling_results[state] = polling_result
+            self.timings[state]['persist'] += time.perf_counter() - start
+            if len(self.polling_results) == len(self.states):
+                self.finished.set()
+
+    async def run(self):
+        remaining_states = self.states
+        if self.checkpoint is not None and self.checkpoint.done:
+            self.polling_results.update({state: result for state, result in self.checkpoint.done.items()
+                                         if state in self.states})
+            remaining_states = [state for state in self.states if state not in self.polling_results]
+            print(f"Resuming from checkpoint: {len(self.polling_results)} states already done, "
+                  f"{len(remaining_states)} left to scrape")
+        if not remaining_states:
+            return self.ordered_results()
+
+        for state in remaining_states:
+            self.fetch_queue.put_nowait((state, 'Harris'))
+
+        tasks = [asyncio.create_task(self.fetch_worker()) for _ in range(self.workers)]
+        tasks += [asyncio.create_task(self.parse_worker()),
+                  asyncio.create_task(self.aggregate_worker()),
+                  asyncio.create_task(self.persist_worker())]
+        finished = asyncio.create_task(self.finished.wait())
+        try:
+            # stop on the first stage that fails, rather than waiting forever for states that will never arrive
+            done, _ = await asyncio.wait(tasks + [finished], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task is not finished:
+                    task.result()
+        finally:
+            for task in tasks + [finished]:
+                task.cancel()
+            await asyncio.gather(*tasks, finished, return_exceptions=True)
+            # cancelling a fetch task leaves its page load running in its thread, still holding a driver; let those
+            # finish, and drop the ones not started, before quitting the browsers
+            await asyncio.to_thread(self.fetch_executor.shutdown, wait=True, cancel_futures=True)
+            await asyncio.to_thread(self.driver_pool.close)
+        return self.ordered_results()
+
+    def ordered_results(self):
+        return {state: self.polling_results[state] for state in self.states}
+
+
+def print_stage_timings(timings):
+    if not timings:
+        return
+    print('Time taken per state and stage (seconds):')
+    print(f'  {"state":<22}' + ''.join(f'{stage:>11}' for stage in STAGES))
+    for state, stage_timings in sorted(timings.items(), key=lambda item: sum(item[1].values()), reverse=True):
+        print(f'  {fix_state_name(state):<22}' + ''.join(f'{stage_timings[stage]:>11.2f}' for stage in STAGES))
+    print(f'  {"total":<22}' + ''.join(f'{sum(t[stage] for t in timings.values()):>11.2f}' for stage in STAGES))
+
+
+def main(workers=SCRAPE_WORKERS, rate=SCRAPE_REQUESTS_PER_SECOND, burst=SCRAPE_BURST,
+         per_host=SCRAPE_PER_HOST_CONCURRENCY):
+    start_time = datetime.now()
+    run_date = start_time.date()
+    print(f'Getting polling results for each state through the async pipeline ({workers} fetchers, '
+          f'{rate} pages/s, at most {per_host} per host)...')
+
+    checkpoint = StateCheckpoint(run_date.strftime('%Y-%m-%d'))
+    pipeline = Pipeline(list(STATE_AND_THEIR_ELECTORAL_VOTES.keys()), run_date, workers, rate, burst, per_host,
+                        checkpoint)
+    polling_results = asyncio.run(pipeline.run())
+
+    print_stage_timings(pipeline.timings)
+
+    save_results(polling_results, run_date)
+    checkpoint.clear()
+
+    print(f"Time taken: {datetime.now() - start_time}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Scrape state polling from 538 through an asyncio pipeline.')
+    parser.add_argument('--workers', type=int, default=SCRAPE_WORKERS, help='number of pages fetched at once')
+    parser.add_argument('--rate', type=float, default=SCRAPE_REQUESTS_PER_SECOND,
+                        help='page loads per second allowed across all fetchers')
+    parser.add_argument('--burst', type=int, default=SCRAPE_BURST, help='page loads allowed back to back')
+    parser.add_argument('--per-host', type=int, default=SCRAPE_PER_HOST_CONCURRENCY,
+                        help='page loads allowed in flight per host')
+    args = parser.parse_args()
+    main(args.workers, args.rate, args.burst, args.per_host)
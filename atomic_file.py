@@ -0,0 +1,42 @@
+# writes files so that nothing reading them, and no crash part way through, ever sees half a file: everything is
+# written under a temporary name in the destination's directory and then renamed over the destination with os.replace,
+# which either happens completely or not at all.
+
+import os
+import uuid
+
+
+class AtomicPath:
+
+    # path: where the file should end up. suffix: the temporary file's extension, for writers (like ffmpeg) that go by
+    # it. The temporary file is not created, only named.
+    def __init__(self, path, suffix='.tmp'):
+        self.path = path
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        self.tmp_path = os.path.join(directory, f'.{os.path.basename(path)}.{uuid.uuid4().hex[:12]}{suffix}')
+
+    # Move the finished temporary file into place
+    def commit(self):
+        os.replace(self.tmp_path, self.path)
+
+    def discard(self):
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    # Used as a context manager, gives the temporary path to write to, which is moved into place if the with block
+    # finishes and removed if it raises
+    def __enter__(self):
+        return self.tmp_path
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+
+def atomic_write(path, data):
+    with AtomicPath(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
@@ -0,0 +1,86 @@
+# fills in every day missing between the first and last days of the history, so plot.py and animate_map.py have no
+# holes. Each missing day is interpolated between the days either side of it (see interpolation.fill_dates), all in one
+# pass, and written to POLLING_RESULTS_DIR and ELECTORAL_VOTE_COUNTS_DIR like a scraped day, with its provenance:
+# every state is marked 'interpolated', keeps the used_biden_2024_polling and used_2020_results flags of the nearer
+# real day, and the electoral vote counts record the days they were interpolated from under 'interpolated_from'.
+#
+# Running it again does nothing once there are no gaps. A day with only one of its two files is left alone and
+# reported, rather than overwritten.
+#
+# Run with: python backfill.py [--dry-run] [--easing EASING]
+
+import argparse
+import json
+import os
+import time
+from datetime import date as Date, timedelta
+
+from history_store import load_history
+from atomic_file import atomic_write
+import interpolation
+
+from constants import POLLING_RESULTS_DIR, ELECTORAL_VOTE_COUNTS_DIR
+
+
+def polling_results_path(date):
+    return os.path.join(POLLING_RESULTS_DIR, f'polling_results_{date}.json')
+
+
+def electoral_votes_path(date):
+    return os.path.join(ELECTORAL_VOTE_COUNTS_DIR, f'electoral_votes_{date}.json')
+
+
+# Every date between the first and last days of the history that isn't in it
+def missing_dates(history):
+    if not len(history):
+        return []
+    first, last = Date.fromisoformat(history.dates[0]), Date.fromisoformat(history.dates[-1])
+    every_day = ((first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1))
+    return [date for date in every_day if date not in history]
+
+
+# Interpolate and save the given dates, none of which may be in the history. Returns the dates saved.
+def fill_days(history, dates, easing='linear'):
+    days, neighbours = interpolation.fill_dates(history, dates, easing)
+    for i, (date, (day_before, day_after)) in enumerate(zip(dates, neighbours)):
+        electoral_votes = days.electoral_votes(i)
+        electoral_votes['interpolated_from'] = [day_before, day_after]
+        atomic_write(polling_results_path(date), json.dumps(days.polling_results(i), indent=4).encode())
+        atomic_write(electoral_votes_path(date), json.dumps(electoral_votes).encode())
+        print(f'Interpolated {date} between {day_before} and {day_after}: Harris {electoral_votes["Harris"]}, '
+              f'Trump {electoral_votes["Trump"]}')
+    return dates
+
+
+def main(dry_run=False, easing='linear'):
+    start = time.perf_counter()
+    history = load_history()
+    missing = missing_dates(history)
+
+    # half of a day on disk is someone else's, or a run that was cut short; leave it for a person to look at
+    incomplete = [date for date in missing
+                  if os.path.exists(polling_results_path(date)) or os.path.exists(electoral_votes_path(date))]
+    for date in incomplete:
+        print(f'{date} has only one of its polling results and electoral vote files, not filling it in')
+    missing = [date for date in missing if date not in incomplete]
+
+    if not missing:
+        print('No days missing')
+        return []
+    if dry_run:
+        print(f'{len(missing)} day{"" if len(missing) == 1 else "s"} missing: {", ".join(missing)}')
+        return missing
+
+    fill_days(history, missing, easing)
+    load_history()  # add the new days to the store
+    print(f'Filled in {len(missing)} day{"" if len(missing) == 1 else "s"} in {time.perf_counter() - start:.2f}s')
+    return missing
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Interpolate every day missing from the polling history.')
+    parser.add_argument('--dry-run', action='store_true', help='only list the missing days')
+    parser.add_argument('--easing', choices=sorted(interpolation.EASINGS), default='linear',
+                        help='how the margins move between the days either side of a gap')
+    args = parser.parse_args()
+    main(args.dry_run, args.easing)
@@ -1,21 +1,15 @@
 import matplotlib.pyplot as plt
-from constants import BOX_COLOR, BOX_TRANSPARENCY, POLLING_RESULTS_DIR, ELECTORAL_VOTE_COUNTS_DIR
+from constants import BOX_COLOR, BOX_TRANSPARENCY
 
-import os
-import json
+from history_store import load_history
+
+BAR_GAP_SIZE = 1  # room left at either end of the horizontal bar for its labels
 
 
 def get_max_votes():
     # Determine the maximum number of electoral votes
-    max_votes = 0
-    for fn in os.listdir(POLLING_RESULTS_DIR):
-        if fn.endswith('.json'):
-            # Load electoral vote counts
-            with open(os.path.join(ELECTORAL_VOTE_COUNTS_DIR,
-                                   fn.replace('polling_results', 'electoral_votes'))) as file:
-                electoral_vote_counts = json.load(file)
-            max_votes = max(max_votes, max(electoral_vote_counts.values()))
-    return max_votes
+    history = load_history()
+    return int(history.totals.max()) if len(history) else 0
 
 
 def plot_horizontal_bar(fig, ax, val1, val2):
@@ -27,7 +21,7 @@ def plot_horizontal_bar(fig, ax, val1, val2):
     # Remove axes and ticks
     ax.axis('off')
 
-    gap_size = 1
+    gap_size = BAR_GAP_SIZE
 
     # Add text labels
     ax.text(-gap_size, 0.5, f'Trump : {int(val1)}', color='black', va='center', ha='left', fontsize=30)
@@ -52,6 +46,23 @@ def plot_horizontal_bar(fig, ax, val1, val2):
                                       transform=fig.transFigure, figure=fig, linewidth=1.5)])
 
 
+# Move the bar, labels and midpoint marker drawn by plot_horizontal_bar to new vote counts, without redrawing them
+def update_horizontal_bar(ax, val1, val2):
+    trump_bar, harris_bar = ax.patches[:2]
+    trump_label, harris_label = ax.texts[:2]
+
+    trump_bar.set_width(val1)
+    harris_bar.set_x(val1)
+    harris_bar.set_width(val2)
+
+    trump_label.set_text(f'Trump : {int(val1)}')
+    harris_label.set_x(val1 + val2 + BAR_GAP_SIZE)
+    harris_label.set_text(f'Harris : {int(val2)}')
+
+    ax.lines[0].set_xdata([(val1 + val2) / 2])
+    ax.set_xlim(-BAR_GAP_SIZE, val2 + val1 + BAR_GAP_SIZE)
+
+
 def plot_vertical_bars(fig, ax, electoral_vote_count_data):
 
     max_votes = get_max_votes()
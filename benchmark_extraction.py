@@ -0,0 +1,49 @@
+# compare the two ways simulate.py can read the poll list off a loaded 538 state page: walking it one WebDriver call
+# per element (walk_poll_rows) and parsing a single page_source snapshot locally (parse_poll_rows)
+
+import argparse
+import time
+
+from driver_pool import create_driver
+from simulate import fix_state_name, load_state_page, parse_poll_rows, walk_poll_rows
+
+BENCHMARK_STATES = ['pennsylvania', 'michigan', 'wisconsin', 'georgia', 'arizona']
+
+
+def benchmark_state(s, driver, dem='Harris'):
+    polls = load_state_page(s, dem, driver)
+
+    walk_start = time.perf_counter()
+    walked_rows = walk_poll_rows(polls)
+    walk_seconds = time.perf_counter() - walk_start
+
+    parse_start = time.perf_counter()
+    parsed_rows = parse_poll_rows(driver.page_source)
+    parse_seconds = time.perf_counter() - parse_start
+
+    return walked_rows, walk_seconds, parsed_rows, parse_seconds
+
+
+def main(states):
+    driver = create_driver()
+    try:
+        total_walk_seconds = 0
+        total_parse_seconds = 0
+        for s in states:
+            walked_rows, walk_seconds, parsed_rows, parse_seconds = benchmark_state(s, driver)
+            total_walk_seconds += walk_seconds
+            total_parse_seconds += parse_seconds
+            print(f'{fix_state_name(s)}: {len(walked_rows)} rows walked in {walk_seconds:.2f}s, '
+                  f'{len(parsed_rows)} rows parsed in {parse_seconds:.3f}s'
+                  f'{"" if walked_rows == parsed_rows else " (rows differ!)"}')
+        print(f'Total: walker {total_walk_seconds:.2f}s, parser {total_parse_seconds:.3f}s '
+              f'({total_walk_seconds / max(total_parse_seconds, 1e-9):.0f}x faster)')
+    finally:
+        driver.quit()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark poll extraction from 538 state pages.')
+    parser.add_argument('states', nargs='*', default=BENCHMARK_STATES)
+    args = parser.parse_args()
+    main(args.states)
@@ -0,0 +1,178 @@
+# incremental rebuild of everything generated from the polling history: the daily maps, the line plot and its video,
+# and the map video. Each output is recorded in BUILD_MANIFEST with a hash of everything it was made from (the days it
+# shows, the shapefile and background image, the rendering constants, and the code that draws it), and only outputs
+# whose inputs hash differently, or that are missing, are rebuilt. With --backfill (or BACKFILL_MISSING_DAYS on), days
+# missing from the history are made up by backfill.py first, and written alongside the scraped days.
+#
+# Run with: python build.py [--dry-run] [--force] [--backfill]
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+
+import constants
+from atomic_file import atomic_write
+from backfill import main as backfill_main
+from history_store import load_history
+
+from constants import (
+    DAILY_MAPS_DIR, DAILY_PLOTS_DIR, FINAL_VIDEOS_DIR, SOURCE_IMAGES_DIR, BACKGROUND_IMAGE, PLOT_LAST_N_ONLY,
+    ANIMATE_LAST_N_ONLY, BUILD_MANIFEST, RENDER_WORKERS, BACKFILL_MISSING_DAYS
+)
+
+# the constants each kind of output is drawn with; changing any of them makes those outputs stale
+MAP_CONSTANTS = ['BOX_COLOR', 'BOX_TRANSPARENCY', 'ADD_TITLE', 'BACKGROUND_IMAGE']
+PLOT_CONSTANTS = MAP_CONSTANTS + ['PLOT_LAST_N_ONLY', 'FRAMES_PER_DAY', 'FRAMES_PER_SECOND', 'FINAL_HOLD_IN_SECONDS']
+VIDEO_CONSTANTS = MAP_CONSTANTS + ['ANIMATE_LAST_N_ONLY', 'HOLD_FRAME_COUNT', 'TRANSITION_FRAME_COUNT', 'MAP_VIDEO_FPS',
+                                   'TRANSITION_EASING']
+# the ffmpeg settings every video is encoded with (see video_encoder.py)
+ENCODER_CONSTANTS = ['FFMPEG_CODEC', 'FFMPEG_PRESET', 'FFMPEG_CRF', 'FFMPEG_EXTRA_ARGS']
+
+SHAPEFILE_PATHS = [os.path.join(SOURCE_IMAGES_DIR, f'States_shapefile.{ext}') for ext in ('shp', 'shx', 'dbf', 'prj')]
+
+_file_hashes = {}
+
+
+def hash_file(path):
+    if path not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        _file_hashes[path] = digest.hexdigest()
+    return _file_hashes[path]
+
+
+def hash_values(*values):
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def constant_values(names):
+    return {name: getattr(constants, name) for name in names}
+
+
+def load_manifest():
+    try:
+        with open(BUILD_MANIFEST) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(manifest):
+    atomic_write(BUILD_MANIFEST, json.dumps(manifest, indent=1, sort_keys=True).encode())
+
+
+def is_stale(manifest, output, input_hash):
+    return manifest.get(output) != input_hash or not os.path.exists(output)
+
+
+# Hash of everything a map is drawn from apart from the day it shows
+def map_render_hash():
+    return hash_values([hash_file(path) for path in SHAPEFILE_PATHS],
+                       hash_file(os.path.join(SOURCE_IMAGES_DIR, BACKGROUND_IMAGE)),
+                       constant_values(MAP_CONSTANTS), hash_file('map.py'), hash_file('bar.py'),
+                       hash_file('us_geometry.py'))
+
+
+# Hash of how a video is encoded
+def encoder_hash():
+    return hash_values(constant_values(ENCODER_CONSTANTS), hash_file('video_encoder.py'))
+
+
+def day_hash(history, date):
+    return hash_values(history.polling_results(date), history.electoral_votes(date))
+
+
+# The outputs that can be built, each as {output path: input hash}
+def map_targets(history, shared_hash):
+    return {os.path.join(DAILY_MAPS_DIR, f'polling_results_{date}.png'): hash_values(shared_hash, day_hash(history, date))
+            for date in history.dates}
+
+
+def plot_targets(history):
+    dates = history.dates[-PLOT_LAST_N_ONLY:] if PLOT_LAST_N_ONLY else history.dates
+    name = f'{dates[0].split("-", 1)[-1]}_to_{dates[-1].split("-", 1)[-1]}_line'
+    input_hash = hash_values([day_hash(history, date) for date in dates], constant_values(PLOT_CONSTANTS),
+                             hash_file(os.path.join(SOURCE_IMAGES_DIR, BACKGROUND_IMAGE)),
+                             hash_file('plot.py'), hash_file('map.py'), hash_file('bar.py'))
+    return {os.path.join(DAILY_PLOTS_DIR, f'{name}.png'): input_hash,
+            os.path.join(FINAL_VIDEOS_DIR, 'plots', f'{name}.mp4'): hash_values(input_hash, encoder_hash())}
+
+
+def video_targets(history, map_hashes):
+    dates = history.dates[-ANIMATE_LAST_N_ONLY:] if ANIMATE_LAST_N_ONLY else history.dates
+    input_hash = hash_values([map_hashes[os.path.join(DAILY_MAPS_DIR, f'polling_results_{date}.png')]
+                              for date in dates], constant_values(VIDEO_CONSTANTS), hash_file('animate_map.py'),
+                             hash_file('interpolation.py'), hash_file('frame_compositor.py'), encoder_hash())
+    return {os.path.join(FINAL_VIDEOS_DIR, 'maps', f'{dates[0]}_to_{dates[-1]}_map.mp4'): input_hash}
+
+
+def run_script(script):
+    print(f'Running {script}...')
+    subprocess.run([sys.executable, script], check=True)
+
+
+def main(dry_run=False, force=False, backfill=BACKFILL_MISSING_DAYS):
+    start = time.perf_counter()
+    if backfill:
+        # fill any gaps first, so the maps, plot and video have no holes in them
+        backfill_main(dry_run=dry_run)
+    history = load_history()
+    if not len(history):
+        print('No polling results to build from')
+        return
+    manifest = {} if force else load_manifest()
+
+    maps = map_targets(history, map_render_hash())
+    plots = plot_targets(history)
+    videos = video_targets(history, maps)
+
+    stale_maps = {output: h for output, h in maps.items() if is_stale(manifest, output, h)}
+    stale_plots = {output: h for output, h in plots.items() if is_stale(manifest, output, h)}
+    stale_videos = {output: h for output, h in videos.items() if is_stale(manifest, output, h)}
+
+    for kind, targets, stale in (('daily maps', maps, stale_maps), ('plots', plots, stale_plots),
+                                 ('videos', videos, stale_videos)):
+        print(f'{kind}: {len(stale)} of {len(targets)} out of date'
+              + (f' ({", ".join(sorted(os.path.basename(o) for o in stale)[:5])}{", ..." if len(stale) > 5 else ""})'
+                 if stale else ''))
+
+    if dry_run:
+        return
+
+    if stale_maps:
+        # imported here so an up-to-date build never pays for loading geopandas and matplotlib
+        from matplotlib import colormaps
+        from map import main as map_main
+
+        dates = [os.path.basename(output)[len('polling_results_'):-len('.png')] for output in stale_maps]
+        map_main(color_maps=(colormaps['Reds'], colormaps['Blues']), dates=dates, workers=RENDER_WORKERS)
+        manifest.update(stale_maps)
+        save_manifest(manifest)
+
+    if stale_plots:
+        run_script('plot.py')
+        manifest.update(stale_plots)
+        save_manifest(manifest)
+
+    if stale_videos:
+        run_script('animate_map.py')
+        manifest.update(stale_videos)
+        save_manifest(manifest)
+
+    print(f'Build finished in {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild the maps, plots and videos whose inputs have changed.')
+    parser.add_argument('--dry-run', action='store_true', help='only report what is out of date')
+    parser.add_argument('--force', action='store_true', help='rebuild everything')
+    parser.add_argument('--backfill', action='store_true', default=BACKFILL_MISSING_DAYS,
+                        help='interpolate the days missing from the history first (see backfill.py)')
+    args = parser.parse_args()
+    main(args.dry_run, args.force, args.backfill)
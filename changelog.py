@@ -0,0 +1,128 @@
+# what changed from each day of the history to the next, worked out for every pair of consecutive days at once, as a
+# list of change events:
+#
+#   winner_flip           a state changed hands
+#   lead_drop             a state's leader stayed the same but their lead shrank by more than the threshold (a fraction
+#   lead_increase         of the old lead), or grew by more than it; a lead growing from 0 always counts
+#   source_switch         where a state's result came from changed: Harris' 2024 polling, Biden's 2024 polling, the
+#                         2020 results, or interpolation between scraped days (see backfill.py)
+#   electoral_votes       the overall electoral vote counts changed, with the old and new counts and the difference
+#   overall_winner_flip   the candidate with the most electoral votes changed
+#
+# Each event is a dict with its type and the two dates it is between, and is written out as one line of JSON.
+#
+# Run with: python changelog.py [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--threshold T] [--output FILE]
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from history_store import load_history, STATES, TOTALS_FIELDS
+
+from constants import LEAD_CHANGE_THRESHOLD
+
+SOURCES = ['harris_2024_polling', 'biden_2024_polling', '2020_results', 'interpolated']
+
+
+def overall_winner(harris_votes, trump_votes):
+    return 'Harris' if harris_votes > trump_votes else 'Trump'
+
+
+# The indices of the days in the history from start to end, inclusive; either can be None to run to that end
+def day_range(history, start=None, end=None):
+    dates = np.array(history.dates)
+    first = 0 if start is None else int(np.searchsorted(dates, start, side='left'))
+    last = len(dates) if end is None else int(np.searchsorted(dates, end, side='right'))
+    return np.arange(first, last)
+
+
+# Every change between consecutive days of the history from start to end, in date order, and within a pair of days in
+# STATES order with the overall changes last
+def compute_changes(history, start=None, end=None, threshold=LEAD_CHANGE_THRESHOLD):
+    days = day_range(history, start, end)
+    if len(days) < 2:
+        return []
+    old, new = days[:-1], days[1:]
+
+    winner = np.where(history.harris_won[days], 'Harris', 'Trump')
+    point_diff = history.point_diff[days]
+    # an interpolated state keeps the flags of the day it was nearer to, but didn't come from either
+    source = np.where(history.interpolated[days], 3, np.where(history.used_2020_results[days], 2,
+                                                              np.where(history.used_biden_2024_polling[days], 1, 0)))
+    old_winner, new_winner = winner[:-1], winner[1:]
+    old_pd, new_pd = point_diff[:-1], point_diff[1:]
+    old_source, new_source = source[:-1], source[1:]
+
+    flipped = old_winner != new_winner
+    # how much the lead changed, as a fraction of the old lead; any lead from a lead of 0 is a big change
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative_change = np.where(old_pd > 0, np.abs(new_pd - old_pd) / old_pd, np.where(new_pd > 0, np.inf, 0))
+    significant = ~flipped & (relative_change > threshold)
+    dropped = significant & (new_pd < old_pd)
+    increased = significant & (new_pd > old_pd)
+    switched = old_source != new_source
+
+    totals = history.totals[days]
+    totals_changed = np.any(totals[1:] != totals[:-1], axis=1)
+    harris, trump = TOTALS_FIELDS.index('harris_votes'), TOTALS_FIELDS.index('trump_votes')
+
+    changes = []
+    for pair in range(len(old)):
+        date_from, date_to = history.dates[old[pair]], history.dates[new[pair]]
+        state_changes = flipped[pair] | dropped[pair] | increased[pair] | switched[pair]
+        for j in np.flatnonzero(state_changes):
+            base = {'date_from': date_from, 'date_to': date_to, 'state': STATES[j]}
+            if flipped[pair, j]:
+                changes.append({'type': 'winner_flip', **base,
+                                'from_winner': str(old_winner[pair, j]), 'to_winner': str(new_winner[pair, j]),
+                                'from_point_diff': float(old_pd[pair, j]), 'to_point_diff': float(new_pd[pair, j])})
+            elif dropped[pair, j] or increased[pair, j]:
+                changes.append({'type': 'lead_drop' if dropped[pair, j] else 'lead_increase', **base,
+                                'winner': str(old_winner[pair, j]),
+                                'from_point_diff': float(old_pd[pair, j]), 'to_point_diff': float(new_pd[pair, j]),
+                                'relative_change': float(relative_change[pair, j])})
+            if switched[pair, j]:
+                changes.append({'type': 'source_switch', **base,
+                                'from_source': SOURCES[old_source[pair, j]], 'to_source': SOURCES[new_source[pair, j]]})
+
+        if totals_changed[pair]:
+            old_totals, new_totals = totals[pair], totals[pair + 1]
+            changes.append({'type': 'electoral_votes', 'date_from': date_from, 'date_to': date_to,
+                            'from': dict(zip(TOTALS_FIELDS, map(int, old_totals))),
+                            'to': dict(zip(TOTALS_FIELDS, map(int, new_totals))),
+                            'delta': dict(zip(TOTALS_FIELDS, map(int, new_totals - old_totals)))})
+            old_overall = overall_winner(old_totals[harris], old_totals[trump])
+            new_overall = overall_winner(new_totals[harris], new_totals[trump])
+            if old_overall != new_overall:
+                changes.append({'type': 'overall_winner_flip', 'date_from': date_from, 'date_to': date_to,
+                                'from_winner': old_overall, 'to_winner': new_overall})
+    return changes
+
+
+def write_changes(changes, f):
+    for change in changes:
+        f.write(json.dumps(change) + '\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='List what changed from each day of the polling history to the next.')
+    parser.add_argument('--start', metavar='YYYY-MM-DD', help='first day to compare (default: the first day)')
+    parser.add_argument('--end', metavar='YYYY-MM-DD', help='last day to compare (default: the last day)')
+    parser.add_argument('--threshold', type=float, default=LEAD_CHANGE_THRESHOLD,
+                        help='smallest change in a lead, as a fraction of the old lead, that counts')
+    parser.add_argument('--output', help='file to write the changes to as JSON Lines (default: standard output)')
+    args = parser.parse_args()
+
+    history = load_history()
+    start = time.perf_counter()
+    changes = compute_changes(history, args.start, args.end, args.threshold)
+    elapsed = time.perf_counter() - start
+    if args.output:
+        with open(args.output, 'w') as f:
+            write_changes(changes, f)
+    else:
+        write_changes(changes, sys.stdout)
+    print(f'{len(changes)} changes in {elapsed * 1000:.1f}ms', file=sys.stderr)
@@ -0,0 +1,44 @@
+# per-state checkpoints for a day's scrape in simulate.py, so a run that dies part way through can be restarted and
+# only scrape the states it had not finished yet
+
+import json
+import os
+import threading
+
+from constants import CHECKPOINTS_DIR
+
+
+class StateCheckpoint:
+
+    # Open (or start) the checkpoint for the scrape of the given date (YYYY-MM-DD), loading any states a previous run
+    # for the same date already finished into self.done
+    def __init__(self, date):
+        self.path = os.path.join(CHECKPOINTS_DIR, f'polling_results_{date}.partial.jsonl')
+        self.done = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:  # a line cut short when the previous run died
+                        continue
+                    self.done[entry['state']] = entry['result']
+
+    # Append one finished state to the checkpoint file, flushed to disk before returning
+    def record(self, state, result):
+        with self._lock:
+            os.makedirs(CHECKPOINTS_DIR, exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps({'state': state, 'result': result}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.done[state] = result
+
+    # Remove the checkpoint once the full day's results have been written
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.done = {}
@@ -109,17 +109,115 @@ STATES_AND_2020_OUTCOME = {
 }
 
 
+# scraping
+
+SCRAPE_WORKERS = 4  # number of states simulate.py scrapes in parallel, each with its own browser (1 = serial)
+LIVE_POLLS_URL = 'https://projects.fivethirtyeight.com/polls'
+POLLS_URL = LIVE_POLLS_URL  # point at a page_cache.py fixture server (e.g. http://localhost:8538/polls) to scrape offline
+SAVE_PAGE_SNAPSHOTS = True  # whether simulate.py saves every page it reads, for replaying with simulate.py --replay
+PAGE_LOAD_TIMEOUT = 20  # seconds to wait for the search box and poll list to appear on a 538 state page
+SCRAPE_MAX_ATTEMPTS = 5  # times to try scraping a state before giving up on the run
+SCRAPE_BACKOFF_SECONDS = 2  # delay before the first retry, doubled for each retry after that
+SCRAPE_MAX_BACKOFF_SECONDS = 60  # longest delay between retries
+
+# async_scrape.py
+SCRAPE_REQUESTS_PER_SECOND = 1.0  # page loads per second allowed across all fetchers
+SCRAPE_BURST = 4  # page loads allowed back to back before the rate limit kicks in
+SCRAPE_PER_HOST_CONCURRENCY = 4  # page loads allowed in flight per host
+PIPELINE_QUEUE_SIZE = 8  # items each pipeline stage can queue up for the next
+
+# ingest_polls.py
+CSV_CHUNK_SIZE = 50000  # rows of the 538 poll CSV read into memory at a time
+
+
+# forecasting (forecast.py)
+
+POLL_ERROR_SD = 4.0  # standard deviation, in points, of a state's true margin around its recent Harris polling
+BIDEN_POLLING_ERROR_SD = 6.0  # the same, for states decided by Biden's 2024 polling
+RESULTS_2020_ERROR_SD = 8.0  # the same, for states decided by the 2020 result
+MONTE_CARLO_DRAWS = 1_000_000  # number of simulated elections
+MONTE_CARLO_CHUNK_SIZE = 100_000  # simulated elections drawn at a time, which bounds memory use
+
+# correlated errors (forecast.py --correlated): each state's error is split into a national part shared by all states,
+# a regional part shared within its region below, and a part of its own
+NATIONAL_ERROR_SD = 2.5
+REGIONAL_ERROR_SD = 2.0
+MIN_STATE_ERROR_SD = 1.0
+
+STATE_REGIONS = {
+    "alabama": "deep south",
+    "alaska": "mountain west",
+    "arizona": "sun belt",
+    "arkansas": "deep south",
+    "california": "pacific",
+    "colorado": "mountain west",
+    "connecticut": "northeast",
+    "delaware": "mid-atlantic",
+    "florida": "sun belt",
+    "georgia": "sun belt",
+    "hawaii": "pacific",
+    "idaho": "mountain west",
+    "illinois": "midwest",
+    "indiana": "midwest",
+    "iowa": "midwest",
+    "kansas": "plains",
+    "kentucky": "appalachia",
+    "louisiana": "deep south",
+    "maine": "northeast",
+    "maryland": "mid-atlantic",
+    "massachusetts": "northeast",
+    "michigan": "rust belt",
+    "minnesota": "midwest",
+    "mississippi": "deep south",
+    "missouri": "midwest",
+    "montana": "mountain west",
+    "nebraska": "plains",
+    "nevada": "sun belt",
+    "new-hampshire": "northeast",
+    "new-jersey": "mid-atlantic",
+    "new-mexico": "mountain west",
+    "new-york": "northeast",
+    "north-carolina": "sun belt",
+    "north-dakota": "plains",
+    "ohio": "rust belt",
+    "oklahoma": "plains",
+    "oregon": "pacific",
+    "pennsylvania": "rust belt",
+    "rhode-island": "northeast",
+    "south-carolina": "deep south",
+    "south-dakota": "plains",
+    "tennessee": "appalachia",
+    "texas": "sun belt",
+    "utah": "mountain west",
+    "vermont": "northeast",
+    "virginia": "mid-atlantic",
+    "washington": "pacific",
+    "district-of-columbia": "mid-atlantic",
+    "west-virginia": "appalachia",
+    "wisconsin": "rust belt",
+    "wyoming": "mountain west"
+}
+
+
 # directories
 
 # simulation results
 POLLING_RESULTS_DIR = 'polling_results/'  # Directory where polling results are stored
 ELECTORAL_VOTE_COUNTS_DIR = 'electoral_vote_counts/'  # Directory where electoral vote counts are stored
+HISTORY_STORE_DIR = 'history'  # Directory where history_store.py keeps every day's results in a single binary file
+
+CHECKPOINTS_DIR = 'checkpoints'  # Directory where partial results of an unfinished scrape are kept
+PAGE_SNAPSHOTS_DIR = 'page_snapshots'  # Directory where compressed copies of scraped 538 pages are stored
 
 # visualizations
 DAILY_MAPS_DIR = 'daily_maps'
 DAILY_PLOTS_DIR = 'daily_plots'
 SOURCE_IMAGES_DIR = 'source_images'
+GEOMETRY_CACHE_DIR = 'geometry_cache'  # Directory where us_geometry.py caches the transformed state outlines
+FRAME_CACHE_DIR = 'frame_cache'  # Directory where frame_cache.py keeps map frames rendered by earlier runs
 FINAL_VIDEOS_DIR = 'videos'
+BUILD_MANIFEST = '.build_manifest.json'  # where build.py records what each map, plot and video was built from
+BACKFILL_MISSING_DAYS = False  # whether build.py interpolates days missing from the history first (see backfill.py)
 
 
 # images: maps/plots
@@ -132,6 +230,9 @@ BACKGROUND_IMAGE = 'trump_harris.png'  # in SOURCE_IMAGES_DIR
 
 PLOT_LAST_N_ONLY = None
 
+RENDER_WORKERS = 4  # number of processes map.py and animate_map.py render frames in (1 = serial)
+RENDER_MAX_FRAMES_IN_FLIGHT = 40  # rendered frames allowed to wait for the writer at once, which bounds memory use
+
 
 # plot animations
 
@@ -153,9 +254,38 @@ TRANSITION_ELECTORAL_COUNTS_DIR = f'{TRANSITION_FRAMES_DIR}/electoral_vote_count
 
 HOLD_FRAME_COUNT = 10
 TRANSITION_FRAME_COUNT = 10
+TRANSITION_EASING = 'linear'  # how transitions move between days: linear, smoothstep, ease_in, ease_out or cosine
+SAVE_TRANSITION_FRAMES = False  # whether animate_map.py also writes every transition frame to TRANSITION_FRAMES_DIR
+# disk space for cached frames, 0 to not cache. A frame is 7.3 MiB at 1600x1600, and the whole history's 777 distinct
+# transition frames take 5.6 GiB.
+FRAME_CACHE_MAX_BYTES = 8 * 2 ** 30
+
+
+# video encoding (video_encoder.py)
+
+FFMPEG_PATH = 'C:\\Users\\philh\\ffmpeg\\bin\\ffmpeg.exe'  # falls back to ffmpeg on PATH if this doesn't exist
+FFMPEG_CODEC = 'libx264'
+FFMPEG_PRESET = 'medium'  # x264 speed/size trade-off: ultrafast ... veryslow
+FFMPEG_CRF = 18  # x264 quality: lower is better and bigger, 18 is close to visually lossless
+FFMPEG_EXTRA_ARGS = []  # any other output options to pass to ffmpeg
+MAP_VIDEO_FPS = 30  # frames per second of animate_map.py's video
+
+
+# change log (changelog.py, what_changed_today.py)
+
+LEAD_CHANGE_THRESHOLD = 0.5  # a lead counts as having dropped or grown if it changes by more than this fraction of itself
 
 
 # Google Drive upload
 
 GOOGLE_DRIVE_UPLOAD_PATH = "G:\\My Drive\\election_sims_2024\\today"
 SAVE_TO_GOOGLE_DRIVE = True  # whether animate_map.py and plot.py will upload to Google Drive
+
+
+# output fan-out (fan_out.py)
+
+# directories every finished video is copied into once it has been encoded, e.g. sync folders or a second disk
+OUTPUT_DESTINATIONS = [GOOGLE_DRIVE_UPLOAD_PATH] if SAVE_TO_GOOGLE_DRIVE else []
+# a command run on every finished video after it has been copied, with {path} and {name} in its arguments replaced by
+# the video's path and file name, e.g. ['rclone', 'copyto', '{path}', 'remote:election/{name}'], or None for none
+OUTPUT_UPLOAD_HOOK = None
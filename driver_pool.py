@@ -0,0 +1,115 @@
+# a small pool of headless Chrome sessions shared by the scraping threads in simulate.py, so each state reuses an
+# already running browser instead of launching a new one for every page it needs
+
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from constants import PAGE_LOAD_TIMEOUT
+
+
+def create_driver():
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    return webdriver.Chrome(options=options)
+
+
+# Block until the element with the given locator is on the page, rather than sleeping for a fixed amount of time
+def wait_for(driver, by, value, timeout=PAGE_LOAD_TIMEOUT):
+    return WebDriverWait(driver, timeout).until(EC.presence_of_element_located((by, value)))
+
+
+def wait_for_search_box(driver):
+    return wait_for(driver, By.ID, 'search-box')
+
+
+def wait_for_polls(driver):
+    return wait_for(driver, By.CLASS_NAME, 'polls')
+
+
+class DriverPool:
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = queue.Queue()  # drivers not checked out, and None whenever a slot for a new one may have opened
+        self._all = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                if self._closed:
+                    # pass the wake-up on to the next caller still waiting
+                    self._idle.put(None)
+                    raise RuntimeError('the driver pool has been closed')
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    if len(self._all) < self.size:
+                        driver = create_driver()
+                        self._all.append(driver)
+                        return driver
+                driver = self._idle.get()
+            if driver is not None:
+                return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            # close may already have taken it out of the pool and quit it
+            if driver in self._all:
+                self._all.remove(driver)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+        # wake a caller waiting for an idle driver, which can now start a new one in its place
+        self._idle.put(None)
+
+    # Check a driver out of the pool for the duration of the with block. The driver is reset before it goes back in
+    # the pool; a driver that failed or cannot be reset is quit and replaced by a fresh one on the next checkout.
+    @contextmanager
+    def checkout(self):
+        driver = self._acquire()
+        try:
+            yield driver
+        except BaseException:
+            self._discard(driver)
+            raise
+        try:
+            driver.delete_all_cookies()
+            driver.get('about:blank')
+        except WebDriverException:
+            self._discard(driver)
+        else:
+            with self._lock:
+                closed = self._closed
+            if closed:
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            drivers, self._all = self._all, []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except WebDriverException:
+                pass
+        # wake anyone waiting for a driver, so they find the pool closed
+        self._idle.put(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,72 @@
+# copies a finished output (a video or an image) to every other place it should end up, so it is only ever rendered and
+# encoded once however many destinations there are.
+#
+# Each copy is made under a temporary name in the destination directory and renamed into place, so nothing watching a
+# destination (like the Google Drive sync client) ever sees half a file. A copy is a copy-on-write clone where the
+# filesystem supports it, otherwise a hard link where the destination is on the same filesystem, and only otherwise
+# are the bytes copied. Outputs are always written whole and renamed into place rather than rewritten, so a hard
+# linked destination never changes under whoever is reading it.
+
+import os
+import shutil
+import subprocess
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from atomic_file import AtomicPath
+from constants import OUTPUT_DESTINATIONS, OUTPUT_UPLOAD_HOOK
+
+FICLONE = 0x40049409  # Linux ioctl cloning one file's extents into another (btrfs, XFS, ...)
+
+
+# Make destination a copy-on-write clone of source, returning whether the filesystem could
+def clone(source, destination):
+    if fcntl is None:
+        return False
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        if os.path.exists(destination):
+            os.remove(destination)
+        return False
+
+
+# Put a copy of source at destination atomically, returning how: 'clone', 'hard link', 'copy' or 'already there'
+def link_or_copy(source, destination):
+    if os.path.exists(destination) and os.path.samefile(source, destination):
+        return 'already there'
+    with AtomicPath(destination) as tmp_path:
+        if clone(source, tmp_path):
+            method = 'clone'
+        else:
+            try:
+                os.link(source, tmp_path)
+                method = 'hard link'
+            except OSError:
+                shutil.copyfile(source, tmp_path)
+                method = 'copy'
+    return method
+
+
+# Copy the file at path into every destination directory, then run the upload hook on it. A destination that can't be
+# written to (a sync folder on a drive that isn't mounted, say) is reported and skipped rather than stopping the rest.
+def fan_out(path, destinations=OUTPUT_DESTINATIONS, hook=OUTPUT_UPLOAD_HOOK):
+    name = os.path.basename(path)
+    for directory in destinations:
+        destination = os.path.join(directory, name)
+        try:
+            method = link_or_copy(path, destination)
+        except OSError as e:
+            print(f'Could not copy {path} to {destination}: {e}')
+            continue
+        print(f'Copied {path} to {destination} ({method})')
+
+    if hook:
+        command = [arg.format(path=os.path.abspath(path), name=name) for arg in hook]
+        print(f'Running upload hook: {" ".join(command)}')
+        subprocess.run(command, check=True)
@@ -0,0 +1,263 @@
+# probabilistic versions of simulate.simulate_election. simulate_election hands each state to whoever leads in its
+# polling, however small the lead; here each state's margin is treated as uncertain instead, and the outcome is given
+# as a distribution over Harris' electoral vote total.
+#
+# Run with: python forecast.py [YYYY-MM-DD] [--draws N] [--seed S] [--exact] [--history]
+#                                         [--correlated [--workers N]]
+
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from history_store import load_history
+
+from constants import (
+    STATE_AND_THEIR_ELECTORAL_VOTES, POLL_ERROR_SD, BIDEN_POLLING_ERROR_SD, RESULTS_2020_ERROR_SD,
+    MONTE_CARLO_DRAWS, MONTE_CARLO_CHUNK_SIZE, NATIONAL_ERROR_SD, REGIONAL_ERROR_SD, MIN_STATE_ERROR_SD, STATE_REGIONS
+)
+
+STATES = list(STATE_AND_THEIR_ELECTORAL_VOTES.keys())
+ELECTORAL_VOTE_WEIGHTS = np.array([STATE_AND_THEIR_ELECTORAL_VOTES[state] for state in STATES])
+TOTAL_ELECTORAL_VOTES = int(ELECTORAL_VOTE_WEIGHTS.sum())
+VOTES_TO_WIN = TOTAL_ELECTORAL_VOTES // 2 + 1
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+# Harris' margin in each state, in STATES order: positive where she leads, negative where Trump does
+def signed_margins(polling_results):
+    return np.array([polling_results[state]['point_diff'] * (-1 if polling_results[state]['winner'] == 'Trump' else 1)
+                     for state in STATES], dtype=float)
+
+
+# The standard deviation of the polling error assumed for each state, in STATES order. States decided by old Biden
+# polling or by the 2020 result are a lot less certain than states with recent Harris polling.
+def margin_spreads(polling_results, sd=POLL_ERROR_SD, biden_sd=BIDEN_POLLING_ERROR_SD,
+                   results_2020_sd=RESULTS_2020_ERROR_SD):
+    spreads = np.full(len(STATES), sd, dtype=float)
+    for i, state in enumerate(STATES):
+        if polling_results[state].get('used_2020_results'):
+            spreads[i] = results_2020_sd
+        elif polling_results[state].get('used_biden_2024_polling'):
+            spreads[i] = biden_sd
+    return spreads
+
+
+# The chance Harris carries each state, in STATES order: the probability that a normally distributed margin around the
+# polled one, with the given spreads, comes out above zero
+def state_win_probabilities(polling_results, spreads=None):
+    if spreads is None:
+        spreads = margin_spreads(polling_results)
+    return normal_cdf(signed_margins(polling_results) / spreads)
+
+
+_erf = np.vectorize(math.erf, otypes=[float])
+
+
+def normal_cdf(z):
+    return 0.5 * (1 + _erf(np.asarray(z) / math.sqrt(2)))
+
+
+# Harris' electoral votes for each row of a (draws x states) boolean array of the states she carries, or for a single
+# (states,) array
+def tally_harris_wins(wins):
+    return wins.astype(np.float32) @ ELECTORAL_VOTE_WEIGHTS.astype(np.float32)
+
+
+# Which states the given polling results have, in STATES order. simulate_election counts whichever states it is given.
+def states_given(polling_results):
+    given = {state.lower() for state in polling_results}
+    return np.array([state in given for state in STATES])
+
+
+# Which states Harris carries in the given polling results, in STATES order, as simulate_election counts them. States
+# missing from the results are carried by neither candidate.
+def harris_wins(polling_results):
+    winners = {state.lower(): result['winner'] for state, result in polling_results.items()}
+    return np.array([state in winners and winners[state] != 'Trump' for state in STATES])
+
+
+# Summarise a histogram of Harris' electoral vote totals (counts or probabilities indexed by total)
+def summarize_distribution(histogram):
+    probabilities = histogram / histogram.sum()
+    cumulative = np.cumsum(probabilities)
+    tie = TOTAL_ELECTORAL_VOTES - VOTES_TO_WIN + 1  # 269, where neither candidate reaches 270
+    return {
+        'harris_win_probability': float(probabilities[VOTES_TO_WIN:].sum()),
+        'trump_win_probability': float(probabilities[:tie].sum()),
+        'tie_probability': float(probabilities[tie]),
+        'mean_harris_electoral_votes': float(probabilities @ np.arange(len(probabilities))),
+        'harris_electoral_vote_percentiles': {p: int(np.searchsorted(cumulative, p / 100)) for p in PERCENTILES},
+        'histogram': probabilities,
+    }
+
+
+# Monte Carlo simulation of the election: draw a margin for every state around its polled margin, with the spreads
+# from margin_spreads, and tally Harris' electoral votes in each draw. As the states are independent here, only the sign
+# of each margin matters, so rather than drawing normal margins each state is drawn as a uniform number compared with
+# Harris' chance of carrying it; that gives the same distribution several times faster. Draws are made chunk_size at a
+# time, so memory stays the same however many draws are asked for.
+def simulate_election_monte_carlo(polling_results, draws=MONTE_CARLO_DRAWS, chunk_size=MONTE_CARLO_CHUNK_SIZE,
+                                  seed=None, spreads=None):
+    rng = np.random.default_rng(seed)
+    win_probabilities = state_win_probabilities(polling_results, spreads).astype(np.float32)
+
+    histogram = np.zeros(TOTAL_ELECTORAL_VOTES + 1, dtype=np.int64)
+    for start in range(0, draws, chunk_size):
+        n = min(chunk_size, draws - start)
+        wins = rng.random((n, len(STATES)), dtype=np.float32) < win_probabilities
+        totals = tally_harris_wins(wins).astype(np.int64)
+        histogram += np.bincount(totals, minlength=TOTAL_ELECTORAL_VOTES + 1)
+
+    summary = summarize_distribution(histogram)
+    summary['draws'] = draws
+    return summary
+
+
+# The exact distribution of Harris' electoral votes, with no sampling: starting from certainty of 0 votes, fold in one
+# state at a time, shifting the distribution up by the state's electoral votes with the chance Harris carries it. That
+# is a convolution of the distribution with a two-term polynomial per state. Takes an array of win probabilities of
+# shape (states,) or (days, states) and returns probabilities over 0-538 votes of shape (539,) or (days, 539).
+def exact_distribution(win_probabilities):
+    win_probabilities = np.asarray(win_probabilities, dtype=float)
+    distribution = np.zeros(win_probabilities.shape[:-1] + (TOTAL_ELECTORAL_VOTES + 1,))
+    distribution[..., 0] = 1
+    for i, votes in enumerate(ELECTORAL_VOTE_WEIGHTS):
+        p = win_probabilities[..., i, np.newaxis]
+        shifted = np.zeros_like(distribution)
+        shifted[..., votes:] = distribution[..., :-votes]
+        distribution = distribution * (1 - p) + shifted * p
+    return distribution
+
+
+# The exact distribution of Harris' electoral votes for one day's polling results, summarised like the Monte Carlo
+# forecast, using the same per-state win probabilities
+def electoral_vote_distribution(polling_results, spreads=None):
+    return summarize_distribution(exact_distribution(state_win_probabilities(polling_results, spreads)))
+
+
+# The exact distribution for every day in the history store, all days folded together in one pass.
+# Returns {date: summary} in date order.
+def distribution_history():
+    history = load_history()
+    spreads = np.where(history.used_2020_results, RESULTS_2020_ERROR_SD,
+                       np.where(history.used_biden_2024_polling, BIDEN_POLLING_ERROR_SD, POLL_ERROR_SD))
+    distributions = exact_distribution(normal_cdf(history.signed_margin / spreads))
+    return {date: summarize_distribution(distribution) for date, distribution in zip(history.dates, distributions)}
+
+
+# The covariance of the polling errors across states, built from three independent components: a national error
+# shared by every state, a regional error shared by the states in each region of STATE_REGIONS, and an error of each
+# state's own. The state component is sized so each state's total spread still matches margin_spreads.
+def error_covariance(polling_results, national_sd=NATIONAL_ERROR_SD, regional_sd=REGIONAL_ERROR_SD):
+    regions = np.array([STATE_REGIONS[state] for state in STATES])
+    same_region = regions[:, np.newaxis] == regions[np.newaxis, :]
+
+    shared_variance = national_sd ** 2 + regional_sd ** 2
+    state_variance = np.maximum(margin_spreads(polling_results) ** 2 - shared_variance, MIN_STATE_ERROR_SD ** 2)
+
+    return national_sd ** 2 + regional_sd ** 2 * same_region + np.diag(state_variance)
+
+
+def _correlated_histogram(means, factor, draws, chunk_size, seed):
+    rng = np.random.default_rng(seed)
+    histogram = np.zeros(TOTAL_ELECTORAL_VOTES + 1, dtype=np.int64)
+    for start in range(0, draws, chunk_size):
+        n = min(chunk_size, draws - start)
+        margins = rng.standard_normal((n, len(STATES)), dtype=np.float32) @ factor.T
+        margins += means
+        totals = tally_harris_wins(margins > 0).astype(np.int64)
+        histogram += np.bincount(totals, minlength=TOTAL_ELECTORAL_VOTES + 1)
+    return histogram
+
+
+# Monte Carlo simulation with polling errors correlated across states, so that, say, the Rust Belt states miss
+# together. The covariance (states x states, in STATES order; error_covariance by default) is factored once, and each
+# chunk of draws is a matrix of independent normals multiplied by the factor. With workers > 1 the draws are split
+# across that many processes, each with its own independent random stream.
+def simulate_election_correlated(polling_results, covariance=None, draws=MONTE_CARLO_DRAWS,
+                                 chunk_size=MONTE_CARLO_CHUNK_SIZE, seed=None, workers=1):
+    if covariance is None:
+        covariance = error_covariance(polling_results)
+    factor = np.linalg.cholesky(covariance).astype(np.float32)
+    means = signed_margins(polling_results).astype(np.float32)
+
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    worker_draws = [draws // workers + (1 if i < draws % workers else 0) for i in range(workers)]
+    if workers == 1:
+        histogram = _correlated_histogram(means, factor, draws, chunk_size, seeds[0])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            histograms = executor.map(_correlated_histogram, [means] * workers, [factor] * workers, worker_draws,
+                                      [chunk_size] * workers, seeds)
+            histogram = sum(histograms)
+
+    summary = summarize_distribution(histogram)
+    summary['draws'] = draws
+    return summary
+
+
+def load_polling_results(date):
+    return load_history().polling_results(date)
+
+
+def latest_date():
+    return load_history().dates[-1]
+
+
+def print_summary(summary, label):
+    percentiles = summary['harris_electoral_vote_percentiles']
+    print(f'{label}:')
+    print(f'  Harris wins {summary["harris_win_probability"]:.1%}, Trump wins {summary["trump_win_probability"]:.1%}, '
+          f'269-269 tie {summary["tie_probability"]:.2%}')
+    print(f'  Harris electoral votes: mean {summary["mean_harris_electoral_votes"]:.1f}, '
+          + ', '.join(f'{p}th percentile {v}' for p, v in percentiles.items()))
+
+
+def print_history(history, elapsed):
+    print(f'Exact forecast for {len(history)} days ({elapsed * 1000:.1f}ms):')
+    print(f'  {"date":<12}{"Harris 270+":>12}{"269-269":>10}{"Trump 270+":>12}{"median":>8}')
+    for date, summary in history.items():
+        print(f'  {date:<12}{summary["harris_win_probability"]:>12.1%}{summary["tie_probability"]:>10.2%}'
+              f'{summary["trump_win_probability"]:>12.1%}{summary["harris_electoral_vote_percentiles"][50]:>8}')
+
+
+def main(date=None, draws=MONTE_CARLO_DRAWS, seed=None, exact=False, history=False, correlated=False, workers=1):
+    if history:
+        start = time.perf_counter()
+        summaries = distribution_history()
+        print_history(summaries, time.perf_counter() - start)
+        return
+
+    date = date or latest_date()
+    polling_results = load_polling_results(date)
+
+    start = time.perf_counter()
+    if exact:
+        summary = electoral_vote_distribution(polling_results)
+        label = f'Exact forecast for {date} ({(time.perf_counter() - start) * 1000:.1f}ms)'
+    elif correlated:
+        summary = simulate_election_correlated(polling_results, draws=draws, seed=seed, workers=workers)
+        label = (f'Correlated Monte Carlo forecast for {date} ({draws:,} draws on {workers} '
+                 f'process{"" if workers == 1 else "es"} in {time.perf_counter() - start:.2f}s)')
+    else:
+        summary = simulate_election_monte_carlo(polling_results, draws, seed=seed)
+        label = f'Monte Carlo forecast for {date} ({draws:,} draws in {time.perf_counter() - start:.2f}s)'
+    print_summary(summary, label)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Forecast the election from a day of polling results.')
+    parser.add_argument('date', nargs='?', help='date of the polling results (YYYY-MM-DD); defaults to the newest')
+    parser.add_argument('--draws', type=int, default=MONTE_CARLO_DRAWS)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--exact', action='store_true', help='compute the exact distribution instead of sampling')
+    parser.add_argument('--history', action='store_true', help='compute the exact distribution for every day')
+    parser.add_argument('--correlated', action='store_true',
+                        help='correlate polling errors nationally and by region (see STATE_REGIONS)')
+    parser.add_argument('--workers', type=int, default=1, help='processes to split correlated draws across')
+    args = parser.parse_args()
+    main(args.date, args.draws, args.seed, args.exact, args.history, args.correlated, args.workers)
@@ -0,0 +1,140 @@
+# keeps rendered map frames on disk between runs, keyed by a hash of everything the frame is drawn from: every state's
+# winner and margin, the electoral vote counts, the date in the title, and the render settings (the color maps, the
+# frame size, and the files and constants build.py hashes for a map, plus frame_compositor.py). Consecutive days often
+# have the same results, and every run of animate_map.py animates the whole history again, so most frames of a run
+# have been drawn before.
+#
+# Frames are stored uncompressed as .npy files in FRAME_CACHE_DIR and memory mapped when read back, which is several
+# times faster than composing them again; decoding a PNG of one takes several times longer than composing it. A file's
+# modification time marks when it was last used. The cache is kept under FRAME_CACHE_MAX_BYTES, counted from the
+# directory itself as every worker process of a run writes to it. Only frames not used since the run started are
+# deleted to make room; once the rest fill the cache, new frames are not stored. A run reads its frames in the same
+# order every time, so evicting its own frames (least recently used first or otherwise) would only ever evict frames
+# just before they were needed again, whereas keeping a fixed set of them gets every one of those a hit.
+#
+# Run with: python frame_cache.py [--clear]
+
+import argparse
+import io
+import os
+import time
+
+import numpy as np
+
+from build import map_render_hash, hash_file, hash_values
+from atomic_file import atomic_write
+
+from constants import FRAME_CACHE_DIR, FRAME_CACHE_MAX_BYTES
+
+_settings_hashes = {}  # (color map names, size) -> hash, as hashing the render inputs reads several files
+
+
+def render_settings_hash(color_maps, size):
+    key = (tuple(color_map.name for color_map in color_maps), tuple(size))
+    if key not in _settings_hashes:
+        _settings_hashes[key] = hash_values(map_render_hash(), hash_file('frame_compositor.py'), key)
+    return _settings_hashes[key]
+
+
+def frame_key(settings_hash, polling_results, electoral_vote_counts, date):
+    return hash_values(settings_hash, polling_results, electoral_vote_counts, date)
+
+
+class FrameCache:
+
+    def __init__(self, directory=FRAME_CACHE_DIR, max_bytes=FRAME_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self.run_started = time.time()  # frames used since are in use by the current run, see start_run
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.npy')
+
+    # (path, size, last used) of every cached frame, this process's and any other's
+    def entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npy'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # evicted by another process
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    # Bytes taken up by every cached frame, this process's and any other's
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    # The frame stored under key as a read-only memory mapped array, or None if there isn't one
+    def get(self, key):
+        path = self.path(key)
+        try:
+            frame = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (FileNotFoundError, ValueError):  # not cached, or evicted while being read
+            self.misses += 1
+            return None
+        self.hits += 1
+        return frame
+
+    def put(self, key, frame):
+        if self.max_bytes <= 0:
+            return
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(frame))
+        if self.evict(buffer.tell()):
+            atomic_write(self.path(key), buffer.getbuffer())
+
+    # Delete frames not used by the current run, least recently used first, until there is room for another extra
+    # bytes. Returns whether there is.
+    def evict(self, extra=0):
+        entries = self.entries()
+        size = sum(size for _, size, _ in entries)
+        unused = sorted((entry for entry in entries if entry[2] < self.run_started), key=lambda entry: entry[2])
+        for path, frame_size, _ in unused:
+            if size + extra <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:  # evicted by another process
+                pass
+            except OSError:  # still mapped by a reader, on Windows
+                continue
+            size -= frame_size
+        return size + extra <= self.max_bytes
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            os.remove(path)
+
+
+_cache = None  # the FrameCache for this process
+
+
+def get_frame_cache():
+    global _cache
+    if _cache is None:
+        _cache = FrameCache()
+    return _cache
+
+
+# Mark when the run using this process's cache started, so frames used since then by any of its processes are kept.
+# Given to parallel_render.ordered_map as the initializer of every worker.
+def start_run(run_started):
+    get_frame_cache().run_started = run_started
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show or clear the cache of rendered map frames.')
+    parser.add_argument('--clear', action='store_true', help='delete every cached frame')
+    args = parser.parse_args()
+
+    cache = get_frame_cache()
+    if args.clear:
+        cache.clear()
+    entries = cache.entries()
+    print(f'{len(entries)} frames, {cache.size() / 2 ** 20:.0f} MiB of {cache.max_bytes / 2 ** 20:.0f} MiB '
+          f'in {cache.directory}')
@@ -0,0 +1,257 @@
+# builds map frames with NumPy instead of matplotlib, for the hundreds of transition frames animate_map.py needs.
+#
+# A map.MapRenderer is drawn a few times up front to take the frame apart into layers at output resolution:
+#
+#   base     everything under the states: background image, boxes, map box
+#   labels   which state (if any) covers each pixel, from drawing every state in its own flat color
+#   borders  the state outlines, drawn alone, as colors with coverage
+#   sprites  the bar labels, the midpoint marker and the title, each drawn alone once per distinct text
+#
+# A frame is then the base with every state's pixels set through a label -> color lookup table, the borders blended
+# on top, the two bars painted in, and the sprites blended over them. The map's aspect follows the states Trump wins
+# (see MapRenderer.set_map_aspect), so the layers are kept for every aspect seen.
+#
+# Run with: python frame_compositor.py [--frames N]
+
+import argparse
+import time
+
+import numpy as np
+from matplotlib import colormaps
+from matplotlib.colors import to_rgba
+
+from map import MapRenderer, write_out_date
+
+
+# Agg draws the edges of rectangles on whole pixels, rounding half up
+def snap(x):
+    return int(np.floor(x + 0.5))
+
+
+class Sprite:
+
+    # rgba: the part of a transparent canvas an artist was drawn alone on, starting at the given row and column
+    def __init__(self, rgba, row=0, col=0):
+        rows, cols = np.nonzero(rgba[..., 3])
+        if not len(rows):
+            rows, cols = np.zeros(1, dtype=int), np.zeros(1, dtype=int)
+        crop = rgba[rows.min():rows.max() + 1, cols.min():cols.max() + 1].astype(np.float32)
+        self.rows = slice(row + rows.min(), row + rows.max() + 1)
+        self.cols = slice(col + cols.min(), col + cols.max() + 1)
+        self.alpha = crop[..., 3:] / 255
+        self.premultiplied = crop[..., :3] * self.alpha
+        self.flattened = {}  # id of a base layer -> the sprite already blended onto it
+
+    def overlaps_rows(self, start, stop):
+        return self.rows.start < stop and start < self.rows.stop
+
+    def blend(self, region):
+        return np.rint(self.premultiplied + region[..., :3] * (1 - self.alpha)).astype(np.uint8)
+
+    def blend_onto(self, frame):
+        region = frame[self.rows, self.cols]
+        region[..., :3] = self.blend(region)
+
+    # For a sprite over a part of the frame nothing else draws on: copy in the sprite as blended onto the base once
+    def paste_onto(self, frame, base):
+        if id(base) not in self.flattened:
+            self.flattened[id(base)] = self.blend(base[self.rows, self.cols])
+        frame[self.rows, self.cols, :3] = self.flattened[id(base)]
+
+
+# The layers of a frame for one map aspect
+class Layers:
+
+    def __init__(self, base, labels, borders):
+        self.base = base
+        # flat indices of the pixels each state covers, with the state (1-based) they belong to
+        self.state_pixels = np.flatnonzero(labels)
+        self.state_labels = labels.ravel()[self.state_pixels]
+        # and of the border pixels, with the state under them (0 for none), and their colors premultiplied by their
+        # coverage (out of 255), for blending in integers
+        self.border_pixels = np.flatnonzero(borders[..., 3])
+        self.border_labels = labels.ravel()[self.border_pixels]
+        flat_borders = borders.reshape(-1, 4)[self.border_pixels].astype(np.uint32)
+        self.border_premultiplied = flat_borders[:, :3] * flat_borders[:, 3:] + 127
+        self.border_transparency = 255 - flat_borders[:, 3:]
+
+
+class FrameCompositor:
+
+    def __init__(self, color_maps):
+        self.renderer = MapRenderer(color_maps)
+        self.color_maps = color_maps
+        self.state_keys = self.renderer.state_keys
+        self.layers = {}  # map aspect -> Layers
+        self.text_sprites = {}  # (which text, its string) -> Sprite
+
+        fig = self.renderer.fig
+        self.height, self.width = int(fig.bbox.height), int(fig.bbox.width)
+
+        # the bars span the same rows in every frame, and the bar axes always run from 1 vote left of 0 to 1 vote
+        # right of the total. Agg snaps the bars' edges to whole pixels.
+        self.renderer.render({}, {'Trump': 0, 'Harris': 0}, '2024-01-01')
+        self.renderer.draw()
+        bar_extent = self.renderer.bar_ax.patches[0].get_window_extent()
+        self.bar_rows = slice(snap(self.height - bar_extent.y1), snap(self.height - bar_extent.y0))
+        self.bar_left, self.bar_right = self.renderer.bar_ax.bbox.x0, self.renderer.bar_ax.bbox.x1
+        self.bar_colors = [np.rint(np.array(to_rgba(patch.get_facecolor())[:3]) * 255).astype(np.uint8)
+                           for patch in self.renderer.bar_ax.patches[:2]]
+        self.marker = Sprite(self.draw_alone(self.renderer.bar_ax.lines[0]))
+
+    # Draw a single artist of the renderer's figure on a transparent canvas and return the pixels
+    def draw_alone(self, artist):
+        canvas = self.renderer.fig.canvas
+        canvas.get_renderer().clear()
+        self.renderer.fig.draw_artist(artist)
+        return np.array(canvas.buffer_rgba())
+
+    def layers_for_aspect(self, aspect):
+        if aspect in self.layers:
+            return self.layers[aspect]
+        renderer = self.renderer
+        canvas = renderer.fig.canvas
+        map_ax = renderer.map_ax
+        map_ax.set_aspect(aspect)
+        map_ax.apply_aspect()
+
+        canvas.restore_region(renderer.static_layer)
+        for box in map_ax.patches[:2]:
+            renderer.fig.draw_artist(box)
+        base = np.array(canvas.buffer_rgba())
+
+        # every state in a flat color that encodes its label, with no antialiasing and no outline
+        states = renderer.harris_states
+        line_width = states.get_linewidth()
+        label_colors = np.zeros((len(renderer.polygon_states), 4))
+        label_colors[:, 0] = (renderer.polygon_states + 1) * 4 / 255
+        label_colors[:, 3] = 1
+        states.set_facecolor(label_colors)
+        states.set_edgecolor('none')
+        states.set_antialiased(False)
+        drawn = self.draw_alone(states)
+        labels = np.where(drawn[..., 3] == 255, np.rint(drawn[..., 0] / 4), 0).astype(np.int16)
+
+        # and just the outlines
+        states.set_facecolor('none')
+        states.set_edgecolor(renderer.edge_color)
+        states.set_linewidth(line_width)
+        states.set_antialiased(True)
+        borders = self.draw_alone(states)
+
+        self.layers[aspect] = Layers(base, labels, borders)
+        return self.layers[aspect]
+
+    def text_sprite(self, name, artist, text):
+        key = (name, text)
+        if key not in self.text_sprites:
+            artist.set_text(text)
+            # only look at the pixels around the text, with a margin for antialiasing
+            extent = artist.get_window_extent(self.renderer.fig.canvas.get_renderer())
+            top, left = max(int(self.height - extent.y1) - 2, 0), max(int(extent.x0) - 2, 0)
+            bottom, right = int(self.height - extent.y0) + 3, int(extent.x1) + 3
+            canvas = self.renderer.fig.canvas
+            canvas.get_renderer().clear()
+            self.renderer.fig.draw_artist(artist)
+            pixels = np.asarray(canvas.buffer_rgba())[top:bottom, left:right]
+            self.text_sprites[key] = Sprite(pixels, top, left)
+        return self.text_sprites[key]
+
+    # Draw a sprite, reusing its pixels from earlier frames unless it overlaps the bars
+    def draw_sprite(self, frame, sprite, base):
+        if sprite.overlaps_rows(self.bar_rows.start, self.bar_rows.stop):
+            sprite.blend_onto(frame)
+        else:
+            sprite.paste_onto(frame, base)
+
+    # One frame for the given day (or transition step) as a height x width x RGBA uint8 array
+    def compose(self, polling_results, electoral_vote_counts, date):
+        renderer = self.renderer
+        state_colors, trump_won = renderer.state_colors(polling_results)
+        renderer.set_map_aspect(state_colors, trump_won)
+        layers = self.layers_for_aspect(renderer.map_ax.get_aspect())
+
+        frame = layers.base.copy()
+        flat = frame.reshape(-1, 4)
+
+        # states: label -> color, leaving out states with no result (label 0 is no state). Every pixel of the
+        # background is opaque, so each state pixel is set as one 32-bit RGBA word.
+        lut = np.rint(np.vstack([np.zeros((1, 4)), state_colors]) * 255).astype(np.uint8)
+        lut[:, 3] = np.where(lut[:, 3] > 0, 255, 0)
+        lut_words = lut.view(np.uint32)[:, 0]
+        flat_words = flat.view(np.uint32)[:, 0]
+        if lut[1:, 3].all():
+            flat_words[layers.state_pixels] = lut_words[layers.state_labels]
+        else:
+            shown = lut[layers.state_labels, 3] > 0
+            flat_words[layers.state_pixels[shown]] = lut_words[layers.state_labels[shown]]
+
+        # outlines, except around states left out
+        pixels, premultiplied, transparency = (layers.border_pixels, layers.border_premultiplied,
+                                               layers.border_transparency)
+        if not lut[1:, 3].all():
+            keep = (layers.border_labels == 0) | (lut[layers.border_labels, 3] > 0)
+            pixels, premultiplied, transparency = pixels[keep], premultiplied[keep], transparency[keep]
+        flat[pixels, :3] = (premultiplied + flat[pixels, :3] * transparency) // 255
+
+        # the bar, its labels and the midpoint marker
+        trump_votes, harris_votes = electoral_vote_counts['Trump'], electoral_vote_counts['Harris']
+        scale = (self.bar_right - self.bar_left) / (trump_votes + harris_votes + 2)
+        zero = self.bar_left + scale
+        trump_end, harris_end = snap(zero + trump_votes * scale), snap(zero + (trump_votes + harris_votes) * scale)
+        frame[self.bar_rows, snap(zero):trump_end, :3] = self.bar_colors[0]
+        frame[self.bar_rows, trump_end:harris_end, :3] = self.bar_colors[1]
+
+        # the labels sit at either end of the bar axes whatever the totals, so they stay where __init__ left them
+        trump_label, harris_label = renderer.bar_ax.texts[:2]
+        self.draw_sprite(frame, self.text_sprite('trump', trump_label, f'Trump : {int(trump_votes)}'), layers.base)
+        self.draw_sprite(frame, self.text_sprite('harris', harris_label, f'Harris : {int(harris_votes)}'),
+                         layers.base)
+        self.draw_sprite(frame, self.marker, layers.base)
+
+        if renderer.title is not None:
+            title = f'2024 election outcome based on most recent polling as of {write_out_date(date)}'
+            self.draw_sprite(frame, self.text_sprite('title', renderer.title, title), layers.base)
+
+        return frame
+
+
+_compositors = {}  # color map names -> FrameCompositor, as building one draws the whole figure several times
+
+
+def get_compositor(color_maps):
+    key = tuple(color_map.name for color_map in color_maps)
+    if key not in _compositors:
+        _compositors[key] = FrameCompositor(color_maps)
+    return _compositors[key]
+
+
+if __name__ == '__main__':
+    from history_store import load_history
+
+    parser = argparse.ArgumentParser(description='Time the NumPy frame compositor against the matplotlib renderer.')
+    parser.add_argument('--frames', type=int, default=200, help='number of frames to compose')
+    args = parser.parse_args()
+
+    history = load_history()
+    days = [(history.polling_results(date), history.electoral_votes(date), date) for date in history.dates]
+    compositor = FrameCompositor((colormaps['Reds'], colormaps['Blues']))
+    # draw every title and label once first, as a transition reuses them for all of its frames
+    for day in days:
+        compositor.compose(*day)
+
+    start = time.perf_counter()
+    for i in range(args.frames):
+        compositor.compose(*days[i % len(days)])
+    elapsed = time.perf_counter() - start
+    print(f'compositor: {args.frames} frames in {elapsed:.2f}s ({args.frames / elapsed:.0f} frames/s, '
+          f'{len(compositor.layers)} map aspects)')
+
+    renderer = MapRenderer((colormaps['Reds'], colormaps['Blues']))
+    frames = min(args.frames, 20)
+    start = time.perf_counter()
+    for i in range(frames):
+        renderer.render(*days[i % len(days)])
+        renderer.draw()
+    elapsed = time.perf_counter() - start
+    print(f'renderer:   {frames} frames in {elapsed:.2f}s ({frames / elapsed:.0f} frames/s)')
@@ -0,0 +1,278 @@
+# every day's polling results and electoral vote counts in one binary file, so tools that look at the whole history
+# don't have to open and parse two small JSON files per day.
+#
+# HISTORY_STORE_DIR/history.bin holds one fixed-size record per day (see RECORD_DTYPE), with one slot per state in
+# STATES order. New days (or new versions of a day) are only ever appended; when a date appears more than once the last
+# record wins. The file can be memory-mapped or read in a single call, and load_history gives days x states arrays.
+#
+# Each record also holds the modification times of the two JSON files it was read from, so a day whose files have been
+# rewritten since is read again, and a day whose files have been deleted is dropped. HISTORY_STORE_DIR/layout.json
+# holds the list of states and the record layout the store was written with; a store written with others is rebuilt.
+#
+# Run with: python history_store.py [--rebuild]
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from atomic_file import atomic_write
+from constants import (
+    STATE_AND_THEIR_ELECTORAL_VOTES, POLLING_RESULTS_DIR, ELECTORAL_VOTE_COUNTS_DIR, HISTORY_STORE_DIR
+)
+
+STATES = list(STATE_AND_THEIR_ELECTORAL_VOTES.keys())
+
+HISTORY_FILE = os.path.join(HISTORY_STORE_DIR, 'history.bin')
+LAYOUT_FILE = os.path.join(HISTORY_STORE_DIR, 'layout.json')
+
+RECORD_DTYPE = np.dtype([
+    ('date', 'S10'),
+    ('point_diff', '<f8', (len(STATES),)),
+    ('harris_won', '?', (len(STATES),)),
+    ('used_biden_2024_polling', '?', (len(STATES),)),
+    ('used_2020_results', '?', (len(STATES),)),
+    ('interpolated', '?', (len(STATES),)),  # made up by backfill.py or interpolate_day.py rather than scraped
+    ('trump_votes', '<i4'),
+    ('harris_votes', '<i4'),
+    ('electoral_votes_where_we_used_biden_2024', '<i4'),
+    ('electoral_votes_where_we_used_2020_results', '<i4'),
+    ('source_mtime_ns', '<i8', (2,)),  # of the day's polling results and electoral votes files when they were read
+])
+
+# round tripped through JSON so it compares equal to what is read back from LAYOUT_FILE
+LAYOUT = json.loads(json.dumps({'states': STATES, 'record': RECORD_DTYPE.descr}))
+
+TOTALS_FIELDS = ['trump_votes', 'harris_votes', 'electoral_votes_where_we_used_biden_2024',
+                 'electoral_votes_where_we_used_2020_results']
+
+
+class History:
+
+    # records: an array of RECORD_DTYPE, one per day, sorted by date with no date repeated
+    def __init__(self, records):
+        self.records = records
+        self.dates = [d.decode() for d in records['date']]
+        self.point_diff = records['point_diff']
+        self.harris_won = records['harris_won']
+        self.used_biden_2024_polling = records['used_biden_2024_polling']
+        self.used_2020_results = records['used_2020_results']
+        self.interpolated = records['interpolated']
+        self.trump_votes = records['trump_votes']
+        self.harris_votes = records['harris_votes']
+        self._date_index = {date: i for i, date in enumerate(self.dates)}
+
+    def __len__(self):
+        return len(self.dates)
+
+    # Harris' margin in each state on each day (days x states): positive where she leads, negative where Trump does
+    @property
+    def signed_margin(self):
+        return np.where(self.harris_won, self.point_diff, -self.point_diff)
+
+    # The per-day totals (days x 4), in TOTALS_FIELDS order
+    @property
+    def totals(self):
+        return np.stack([self.records[field] for field in TOTALS_FIELDS], axis=1)
+
+    def index(self, date):
+        return self._date_index[date]
+
+    def __contains__(self, date):
+        return date in self._date_index
+
+    # Whether each day was scraped, rather than interpolated
+    @property
+    def scraped(self):
+        return ~self.interpolated.any(axis=1)
+
+    # One day's polling results, as simulate.py (or, for an interpolated day, backfill.py) writes them to
+    # POLLING_RESULTS_DIR
+    def polling_results(self, date):
+        i = self.index(date)
+        polling_results = {
+            state: {
+                'winner': 'Harris' if self.harris_won[i, j] else 'Trump',
+                'point_diff': float(self.point_diff[i, j]),
+                'used_biden_2024_polling': bool(self.used_biden_2024_polling[i, j]),
+                'used_2020_results': bool(self.used_2020_results[i, j]),
+            }
+            for j, state in enumerate(STATES)
+        }
+        for j, state in enumerate(STATES):
+            if self.interpolated[i, j]:
+                polling_results[state]['interpolated'] = True
+        return polling_results
+
+    # One day's electoral vote counts, as simulate.py writes them to ELECTORAL_VOTE_COUNTS_DIR
+    def electoral_votes(self, date):
+        record = self.records[self.index(date)]
+        return {
+            'Trump': int(record['trump_votes']),
+            'Harris': int(record['harris_votes']),
+            'electoral_votes_where_we_used_biden_2024': int(record['electoral_votes_where_we_used_biden_2024']),
+            'electoral_votes_where_we_used_2020_results': int(record['electoral_votes_where_we_used_2020_results']),
+        }
+
+
+def make_record(date, polling_results, electoral_votes, source_mtime_ns=(0, 0)):
+    record = np.zeros((), dtype=RECORD_DTYPE)
+    record['date'] = date.encode()
+    record['source_mtime_ns'] = source_mtime_ns
+    for j, state in enumerate(STATES):
+        result = polling_results[state]
+        record['point_diff'][j] = result['point_diff']
+        record['harris_won'][j] = result['winner'] != 'Trump'
+        record['used_biden_2024_polling'][j] = result.get('used_biden_2024_polling', False)
+        record['used_2020_results'][j] = result.get('used_2020_results', False)
+        record['interpolated'][j] = result.get('interpolated', False)
+    record['trump_votes'] = electoral_votes['Trump']
+    record['harris_votes'] = electoral_votes['Harris']
+    record['electoral_votes_where_we_used_biden_2024'] = electoral_votes.get(
+        'electoral_votes_where_we_used_biden_2024', 0)
+    record['electoral_votes_where_we_used_2020_results'] = electoral_votes.get(
+        'electoral_votes_where_we_used_2020_results', 0)
+    return record
+
+
+def layout_matches():
+    try:
+        with open(LAYOUT_FILE) as f:
+            return json.load(f) == LAYOUT
+    except FileNotFoundError:
+        return False
+
+
+def day_paths(date):
+    return (os.path.join(POLLING_RESULTS_DIR, f'polling_results_{date}.json'),
+            os.path.join(ELECTORAL_VOTE_COUNTS_DIR, f'electoral_votes_{date}.json'))
+
+
+# Append the given days to the store. days: iterable of (date, polling_results, electoral_votes). mtimes: the
+# modification times of each date's JSON files, as given by source_mtimes; by default they are read now.
+def append_days(days, mtimes=None):
+    records = [make_record(date, polling_results, electoral_votes,
+                           mtimes[date] if mtimes is not None else
+                           tuple(os.stat(path).st_mtime_ns for path in day_paths(date)))
+               for date, polling_results, electoral_votes in days]
+    # a store with an old layout can't be appended to; sync_history rebuilds it from the JSON files, days included
+    if records and layout_matches():
+        with open(HISTORY_FILE, 'ab') as f:
+            f.write(np.stack(records).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def append_day(date, polling_results, electoral_votes):
+    append_days([(date, polling_results, electoral_votes)])
+
+
+def read_records(mmap=True):
+    if not os.path.exists(HISTORY_FILE) or os.path.getsize(HISTORY_FILE) < RECORD_DTYPE.itemsize:
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    if mmap:
+        return np.memmap(HISTORY_FILE, dtype=RECORD_DTYPE, mode='r',
+                         shape=(os.path.getsize(HISTORY_FILE) // RECORD_DTYPE.itemsize,))
+    # a record cut short by a crash mid-append is ignored
+    count = os.path.getsize(HISTORY_FILE) // RECORD_DTYPE.itemsize
+    return np.fromfile(HISTORY_FILE, dtype=RECORD_DTYPE, count=count)
+
+
+# Replace the whole store with the given records
+def write_records(records):
+    atomic_write(HISTORY_FILE, np.ascontiguousarray(records).tobytes())
+
+
+# The files of one directory named prefix + date + '.json', by date, with their modification times
+def dated_file_mtimes(directory, prefix):
+    mtimes = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith(prefix) and entry.name.endswith('.json'):
+                mtimes[entry.name[len(prefix):-len('.json')]] = entry.stat().st_mtime_ns
+    return mtimes
+
+
+# Every day with JSON files in both POLLING_RESULTS_DIR and ELECTORAL_VOTE_COUNTS_DIR, with the modification times of
+# its two files
+def source_mtimes():
+    polling_results = dated_file_mtimes(POLLING_RESULTS_DIR, 'polling_results_')
+    electoral_votes = dated_file_mtimes(ELECTORAL_VOTE_COUNTS_DIR, 'electoral_votes_')
+    return {date: (mtime, electoral_votes[date]) for date, mtime in polling_results.items() if date in electoral_votes}
+
+
+def read_day_from_disk(date):
+    polling_results_path, electoral_votes_path = day_paths(date)
+    with open(polling_results_path) as f:
+        polling_results = json.load(f)
+    with open(electoral_votes_path) as f:
+        electoral_votes = json.load(f)
+    return date, polling_results, electoral_votes
+
+
+# The last record written for each date, in date order
+def latest_records(records):
+    dates = records['date']
+    order = np.argsort(dates, kind='stable')
+    keep = np.ones(len(order), dtype=bool)
+    keep[:-1] = dates[order][1:] != dates[order][:-1]
+    order = order[keep]
+    if len(order) != len(records) or np.any(order != np.arange(len(records))):
+        records = records[order]
+    return records
+
+
+# Bring the store up to date with the JSON files in POLLING_RESULTS_DIR and ELECTORAL_VOTE_COUNTS_DIR: days that are
+# new or whose files have changed since they were read are appended, and days whose files are gone are dropped. The
+# store is only written to if something changed. Returns the dates read and the dates dropped.
+def sync_history():
+    if not layout_matches():
+        return import_history(), []
+    records = latest_records(read_records(mmap=False))
+    stored = dict(zip((d.decode() for d in records['date']), map(tuple, records['source_mtime_ns'].tolist())))
+    mtimes = source_mtimes()
+    changed = sorted(date for date, day_mtimes in mtimes.items() if stored.get(date) != day_mtimes)
+    removed = sorted(set(stored) - set(mtimes))
+    if removed:
+        write_records(records[~np.isin(records['date'], [date.encode() for date in removed])])
+    append_days((read_day_from_disk(date) for date in changed), mtimes)
+    return changed, removed
+
+
+# Import the JSON files in POLLING_RESULTS_DIR and ELECTORAL_VOTE_COUNTS_DIR into a new store, replacing the old one
+def import_history():
+    mtimes = source_mtimes()
+    dates = sorted(mtimes)
+    if not dates and not os.path.exists(HISTORY_FILE):
+        return dates
+    records = np.zeros(len(dates), dtype=RECORD_DTYPE)
+    for i, date in enumerate(dates):
+        records[i] = make_record(*read_day_from_disk(date), mtimes[date])
+    write_records(records)
+    atomic_write(LAYOUT_FILE, json.dumps(LAYOUT).encode())
+    return dates
+
+
+# Load the whole history, sorted by date. The store is brought up to date with the JSON directories first (see
+# sync_history), unless sync is False.
+def load_history(sync=True, mmap=True):
+    if sync:
+        sync_history()
+    return History(latest_records(read_records(mmap)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or update the consolidated polling history store.')
+    parser.add_argument('--rebuild', action='store_true', help='re-import every day from the JSON directories')
+    args = parser.parse_args()
+    if args.rebuild:
+        imported = import_history()
+        print(f'Imported {len(imported)} days into {HISTORY_FILE}')
+    else:
+        changed, removed = sync_history()
+        print(f'Read {len(changed)} day{"" if len(changed) == 1 else "s"} into {HISTORY_FILE}'
+              + (f': {", ".join(changed)}' if changed else ''))
+        if removed:
+            print(f'Dropped {len(removed)} day{"" if len(removed) == 1 else "s"} whose files are gone: '
+                  f'{", ".join(removed)}')
@@ -0,0 +1,135 @@
+# build polling_results and electoral_vote_counts from a downloaded copy of 538's poll dataset (president_polls.csv)
+# instead of scraping 51 state pages. The CSV is read once, in chunks, keeping only the state head-to-heads between
+# Trump and Harris or Biden. Every poll is then turned into the same kind of row simulate.parse_poll_rows reads off a
+# state page, so the weeks-back, tie and fallback rules in simulate.py decide each state exactly as they would for a
+# scrape done on that date.
+#
+# Run with: python ingest_polls.py president_polls.csv [--date YYYY-MM-DD ...] [--start YYYY-MM-DD --end YYYY-MM-DD]
+
+import argparse
+import contextlib
+import os
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from simulate import find_harris_winner, find_biden_winner, make_polling_result, save_results
+
+from constants import STATE_AND_THEIR_ELECTORAL_VOTES, CSV_CHUNK_SIZE
+
+CSV_COLUMNS = ['question_id', 'state', 'end_date', 'cycle', 'stage', 'answer', 'pct', 'ranked_choice_reallocated']
+
+PAIRINGS = {frozenset(['Harris', 'Trump']): 'Harris', frozenset(['Biden', 'Trump']): 'Biden'}
+
+
+def state_key(state_name):
+    return state_name.strip().lower().replace(' ', '-')
+
+
+# Turn one head-to-head question into a poll row like the ones simulate.parse_poll_rows returns. 538 shows the net
+# margin on its pages rounded to a whole point, with no leader when that rounds to zero.
+def make_poll_row(end_date, answers):
+    (name1, pct1), (name2, pct2) = sorted(answers.items())
+    net = round(abs(pct1 - pct2))
+    leader = '' if net == 0 else (name1 if pct1 > pct2 else name2)
+    return {
+        'date': end_date,
+        'leader': leader,
+        'net': net,
+        'answers': [f'{name} {pct:g}%' for name, pct in answers.items()],
+    }
+
+
+# Stream the CSV in chunks and collect every 2024 general election state poll between Trump and Harris or Biden.
+# Returns {(state, dem): [poll rows, newest first]}. Only one dict entry per question is ever held, not the raw rows.
+def read_head_to_heads(csv_path, chunk_size=CSV_CHUNK_SIZE):
+    questions = {}  # question_id -> (state, end date, {answer: pct})
+    polls_read = 0
+
+    chunks = pd.read_csv(csv_path, usecols=lambda c: c in CSV_COLUMNS, chunksize=chunk_size,
+                         dtype={'state': str, 'answer': str, 'stage': str})
+    for chunk in chunks:
+        polls_read += len(chunk)
+        chunk = chunk[(chunk['cycle'] == 2024) & (chunk['stage'] == 'general') & chunk['state'].notna()]
+        if 'ranked_choice_reallocated' in chunk:
+            chunk = chunk[~chunk['ranked_choice_reallocated'].fillna(False).astype(bool)]
+        chunk = chunk[chunk['state'].map(state_key).isin(STATE_AND_THEIR_ELECTORAL_VOTES.keys())]
+
+        for question_id, state, end_date, answer, pct in chunk[
+                ['question_id', 'state', 'end_date', 'answer', 'pct']].itertuples(index=False):
+            if question_id not in questions:
+                questions[question_id] = (state_key(state), datetime.strptime(end_date, '%m/%d/%y').date(), {})
+            questions[question_id][2][answer] = float(pct)
+
+    print(f'Read {polls_read} rows of {csv_path}, covering {len(questions)} state poll questions')
+
+    rows = defaultdict(list)
+    for state, end_date, answers in questions.values():
+        dem = PAIRINGS.get(frozenset(answers))
+        if dem:
+            rows[state, dem].append(make_poll_row(end_date, answers))
+    for poll_rows in rows.values():
+        poll_rows.sort(key=lambda row: row['date'], reverse=True)
+    return rows
+
+
+# Rows as a state page would have shown them on the given date: only polls ending on or before it, newest first
+def rows_as_of(poll_rows, as_of):
+    # poll_rows are sorted newest first, so search on the negated ordinals, which are ascending
+    start = bisect_left([-row['date'].toordinal() for row in poll_rows], -as_of.toordinal())
+    return poll_rows[start:]
+
+
+# Decide every state for the given date, running the same ladder as simulate.get_state_polling_result
+def polling_results_as_of(head_to_heads, as_of):
+    polling_results = {}
+    for state in STATE_AND_THEIR_ELECTORAL_VOTES:
+        harris_rows = rows_as_of(head_to_heads.get((state, 'Harris'), []), as_of)
+        winner, point_diff = find_harris_winner(state, harris_rows, as_of)
+        if winner:
+            polling_results[state] = make_polling_result(state, winner, point_diff)
+            continue
+        biden_rows = rows_as_of(head_to_heads.get((state, 'Biden'), []), as_of)
+        winner, point_diff = find_biden_winner(state, biden_rows, as_of)
+        polling_results[state] = make_polling_result(state, winner, point_diff,
+                                                     used_biden_2024_polling=bool(winner))
+    return polling_results
+
+
+def main(csv_path, dates=None, start=None, end=None):
+    head_to_heads = read_head_to_heads(csv_path)
+    if not head_to_heads:
+        print('No Harris/Trump or Biden/Trump state polls found')
+        return
+
+    if not dates:
+        latest = max(poll_rows[0]['date'] for poll_rows in head_to_heads.values())
+        start = start or end or latest
+        end = end or latest
+        dates = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    for as_of in dates:
+        # the ladder explains every step it takes; for a batch of dates only the outcome is worth printing
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            polling_results = polling_results_as_of(head_to_heads, as_of)
+            save_results(polling_results, as_of)
+
+        harris_votes = sum(STATE_AND_THEIR_ELECTORAL_VOTES[state] for state, result in polling_results.items()
+                           if result['winner'] != 'Trump')
+        print(f'{as_of.isoformat()}: Harris {harris_votes}, Trump {538 - harris_votes}')
+
+
+if __name__ == '__main__':
+    def parse_date(s):
+        return datetime.strptime(s, '%Y-%m-%d').date()
+
+    parser = argparse.ArgumentParser(description="Build daily results from 538's president_polls.csv.")
+    parser.add_argument('csv_path')
+    parser.add_argument('--date', type=parse_date, action='append', dest='dates',
+                        help='date to build results for (repeatable); defaults to the newest poll in the file')
+    parser.add_argument('--start', type=parse_date, help='first date of a range to build results for')
+    parser.add_argument('--end', type=parse_date, help='last date of a range to build results for')
+    args = parser.parse_args()
+    main(args.csv_path, args.dates, args.start, args.end)
@@ -0,0 +1,147 @@
+# interpolates polling results between days, for animate_map.py's transition frames and for filling in days missing
+# from the history. Everything works on signed margins (Harris' lead in each state, negative where Trump leads) held in
+# NumPy arrays with states along the last axis, so every step between every pair of days is computed in one pass.
+#
+# A state that changes hands crosses zero on its signed margin, so it changes winner at the step where its margin does.
+# Electoral vote totals are recomputed from the interpolated winners with forecast.tally_harris_wins, the weights
+# simulate.simulate_election counts with. How the margins move from one day to the next is set by an easing curve:
+# one of EASINGS by name, or any function mapping an array of 0-1 fractions onto 0-1.
+
+from datetime import date as Date
+
+import numpy as np
+
+from forecast import STATES, TOTAL_ELECTORAL_VOTES, ELECTORAL_VOTE_WEIGHTS, tally_harris_wins
+
+
+def linear(t):
+    return t
+
+
+def smoothstep(t):
+    return t * t * (3 - 2 * t)
+
+
+def ease_in(t):
+    return t * t
+
+
+def ease_out(t):
+    return t * (2 - t)
+
+
+def cosine(t):
+    return (1 - np.cos(np.pi * t)) / 2
+
+
+EASINGS = {'linear': linear, 'smoothstep': smoothstep, 'ease_in': ease_in, 'ease_out': ease_out, 'cosine': cosine}
+
+
+def easing_function(easing):
+    return easing if callable(easing) else EASINGS[easing]
+
+
+# Blend signed margins from one set of days to another. alphas (how far along, 0 to 1) broadcast against the margins
+# without their states axis, e.g. alphas of shape (steps,) against margins of shape (days, 1, states) gives every step
+# from every day, (days, steps, states).
+def interpolate_margins(from_margins, to_margins, alphas, easing='linear'):
+    from_margins = np.asarray(from_margins, dtype=float)
+    to_margins = np.asarray(to_margins, dtype=float)
+    weights = np.asarray(easing_function(easing)(np.asarray(alphas, dtype=float)))[..., np.newaxis]
+    margins = from_margins + (to_margins - from_margins) * weights
+    # land exactly on the day being interpolated to
+    return np.where(weights == 1, to_margins, margins)
+
+
+# Who carries each state at the interpolated margins: whoever leads, or at a margin of exactly 0 whoever carried it on
+# the nearer of the two days
+def interpolated_winners(margins, from_harris_won, to_harris_won, alphas):
+    nearer = np.where(np.asarray(alphas)[..., np.newaxis] < 0.5, from_harris_won, to_harris_won)
+    return np.where(margins != 0, margins > 0, nearer)
+
+
+class InterpolatedDays:
+
+    # margins: signed margins (..., states). harris_won: whether Harris carries each state, the same shape. alphas: how
+    # far along from one day to the next each row is. used_biden_2024_polling, used_2020_results: where each state's
+    # result came from, the same shape as margins, for days that will be saved (see fill_dates).
+    def __init__(self, margins, harris_won, alphas, used_biden_2024_polling=None, used_2020_results=None):
+        self.margins = margins
+        self.harris_won = harris_won
+        self.alphas = alphas
+        self.used_biden_2024_polling = used_biden_2024_polling
+        self.used_2020_results = used_2020_results
+        self.harris_votes = np.rint(tally_harris_wins(harris_won)).astype(int)
+        self.trump_votes = TOTAL_ELECTORAL_VOTES - self.harris_votes
+
+    def __len__(self):
+        return len(self.margins)
+
+    def __getitem__(self, index):
+        provenance = [None if flags is None else flags[index]
+                      for flags in (self.used_biden_2024_polling, self.used_2020_results)]
+        return InterpolatedDays(self.margins[index], self.harris_won[index], self.alphas[index], *provenance)
+
+    # The polling results at one row, in the form simulate.py writes them. Without provenance only winner and
+    # point_diff are given; with it, every state is also marked as interpolated.
+    def polling_results(self, index):
+        margins, harris_won = self.margins[index], self.harris_won[index]
+        polling_results = {
+            state: {
+                'winner': 'Harris' if harris_won[j] else 'Trump',
+                'point_diff': float(abs(margins[j])),
+            }
+            for j, state in enumerate(STATES)
+        }
+        if self.used_biden_2024_polling is not None:
+            for j, state in enumerate(STATES):
+                polling_results[state]['used_biden_2024_polling'] = bool(self.used_biden_2024_polling[index][j])
+                polling_results[state]['used_2020_results'] = bool(self.used_2020_results[index][j])
+                polling_results[state]['interpolated'] = True
+        return polling_results
+
+    # The electoral vote counts at one row, in the form simulate.py writes them, with the votes from old polling and
+    # from 2020 results if the provenance is known
+    def electoral_votes(self, index):
+        electoral_votes = {'Trump': int(self.trump_votes[index]), 'Harris': int(self.harris_votes[index])}
+        if self.used_biden_2024_polling is not None:
+            electoral_votes['electoral_votes_where_we_used_biden_2024'] = int(
+                ELECTORAL_VOTE_WEIGHTS @ self.used_biden_2024_polling[index])
+            electoral_votes['electoral_votes_where_we_used_2020_results'] = int(
+                ELECTORAL_VOTE_WEIGHTS @ self.used_2020_results[index])
+        return electoral_votes
+
+
+# count steps from each of the given days of the history to the next, all in one pass: shape (days - 1, count, ...)
+def transitions(history, dates, count, easing='linear'):
+    indices = [history.index(date) for date in dates]
+    margins = history.signed_margin[indices][:, np.newaxis]
+    harris_won = history.harris_won[indices][:, np.newaxis]
+    alphas = np.linspace(0, 1, count)
+    interpolated = interpolate_margins(margins[:-1], margins[1:], alphas, easing)
+    winners = interpolated_winners(interpolated, harris_won[:-1], harris_won[1:], alphas)
+    return InterpolatedDays(interpolated, winners, np.broadcast_to(alphas, winners.shape[:-1]))
+
+
+# The given dates, none of which are in the history, interpolated between the scraped days of the history either side
+# of each by how many days away they are; days that were themselves interpolated are never interpolated from. Where
+# each state's result came from is taken from the nearer of the two days. Returns the InterpolatedDays and, for each
+# date, the dates it was interpolated from.
+def fill_dates(history, dates, easing='linear'):
+    scraped = np.flatnonzero(history.scraped)
+    known = np.array([Date.fromisoformat(history.dates[i]).toordinal() for i in scraped])
+    wanted = np.array([Date.fromisoformat(date).toordinal() for date in dates])
+    after = np.searchsorted(known, wanted)
+    if np.any(after == 0) or np.any(after == len(known)):
+        raise ValueError('can only interpolate dates between the first and last scraped days of the history')
+    before = after - 1
+    alphas = (wanted - known[before]) / (known[after] - known[before])
+    before, after = scraped[before], scraped[after]
+
+    margins = history.signed_margin
+    interpolated = interpolate_margins(margins[before], margins[after], alphas, easing)
+    winners = interpolated_winners(interpolated, history.harris_won[before], history.harris_won[after], alphas)
+    nearer = np.where(alphas < 0.5, before, after)
+    neighbours = [(history.dates[i], history.dates[j]) for i, j in zip(before, after)]
+    return InterpolatedDays(interpolated, winners, alphas, history.used_biden_2024_polling[nearer],
+                            history.used_2020_results[nearer]), neighbours
@@ -1,21 +1,29 @@
-import geopandas as gpd
 import matplotlib.pyplot as plt
+import argparse
+import io
 import json
 import os
 
 import numpy as np
-import pandas as pd
 
-from matplotlib.colors import Normalize, AsinhNorm
-from shapely.affinity import scale, translate
+import shapely
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.colors import Normalize, AsinhNorm, to_rgba
+from matplotlib.figure import Figure
 import matplotlib.image as mpimg
 import matplotlib.patches as patches
 
-from bar import plot_horizontal_bar
+from atomic_file import AtomicPath
+from bar import plot_horizontal_bar, update_horizontal_bar
+from fan_out import link_or_copy
+from history_store import load_history
+from parallel_render import ordered_map
+from us_geometry import load_us_states
 
 from constants import (
     BOX_COLOR, BOX_TRANSPARENCY, GOOGLE_DRIVE_UPLOAD_PATH, DAILY_MAPS_DIR,
-    ELECTORAL_VOTE_COUNTS_DIR, POLLING_RESULTS_DIR, SOURCE_IMAGES_DIR, BACKGROUND_IMAGE, ADD_TITLE
+    ELECTORAL_VOTE_COUNTS_DIR, POLLING_RESULTS_DIR, SOURCE_IMAGES_DIR, BACKGROUND_IMAGE, ADD_TITLE, RENDER_WORKERS,
+    RENDER_MAX_FRAMES_IN_FLIGHT
 )
 
 
@@ -30,39 +38,15 @@ def write_out_date(date):
     return f'{month_dict[month]} {int(day)}, {year}'
 
 
-def main(poll_res_dir=POLLING_RESULTS_DIR, elec_votes_dir=ELECTORAL_VOTE_COUNTS_DIR, out_dirs=None,
-         color_maps=None, return_not_save=False):
-    if out_dirs is None:
-        out_dirs = [DAILY_MAPS_DIR]
-
-    # Set default font
-    plt.rcParams['font.size'] = 22
-    plt.rcParams['font.weight'] = 'bold'
-    plt.rcParams['axes.labelweight'] = 'bold'
-
-    # Load US states shapefile
-    us_states = gpd.read_file(f'{SOURCE_IMAGES_DIR}/States_shapefile.shp')
-
-    # Translate Hawaii
-    us_states.loc[us_states['State_Name'] == 'HAWAII', 'geometry'] = us_states.loc[
-        us_states['State_Name'] == 'HAWAII', 'geometry'].apply(lambda geom: translate(geom, xoff=15, yoff=5))
-
-    # Get the bounds of Alaska
-    alaska_bounds = us_states.loc[us_states['State_Name'] == 'ALASKA', 'geometry'].bounds
-
-    # Get the bottom right corner of Alaska
-    alaska_bottom_right = (alaska_bounds['maxx'].values[0], alaska_bounds['miny'].values[0])
-
-    # Scale Alaska
-    us_states.loc[us_states['State_Name'] == 'ALASKA', 'geometry'] = us_states.loc[
-        us_states['State_Name'] == 'ALASKA', 'geometry'].apply(
-        lambda geom: scale(geom, xfact=0.5, yfact=0.5, origin=alaska_bottom_right))
-    us_states.loc[us_states['State_Name'] == 'HAWAII', 'geometry'] = us_states.loc[
-        us_states['State_Name'] == 'HAWAII', 'geometry'].apply(
-        lambda geom: scale(geom, xfact=1.2, yfact=1.2, origin='center'))
-
-    for output_dir in out_dirs:
-        os.makedirs(output_dir, exist_ok=True)
+# Yield (polling results file name, polling results, electoral vote counts) for every day in the given directories, in
+# order. The main results directories are read through the history store; any other directory (such as the transition
+# frames animate_map.py writes) is read file by file. Pass dates to only load those days from the main directories.
+def load_days(poll_res_dir, elec_votes_dir, dates=None):
+    if poll_res_dir == POLLING_RESULTS_DIR and elec_votes_dir == ELECTORAL_VOTE_COUNTS_DIR:
+        history = load_history()
+        for date in history.dates if dates is None else sorted(dates):
+            yield f'polling_results_{date}.json', history.polling_results(date), history.electoral_votes(date)
+        return
 
     filenames = os.listdir(poll_res_dir)
 
@@ -75,125 +59,258 @@ def main(poll_res_dir=POLLING_RESULTS_DIR, elec_votes_dir=ELECTORAL_VOTE_COUNTS_
         return res
 
     filenames.sort(key=sort_key)
-    result = []
-    # Iterate over polling results files
     for filename in filenames:
         if filename.endswith('.json'):
             # Load polling results
             with open(os.path.join(poll_res_dir, filename)) as f:
                 polling_results = json.load(f)
-
-            # Create a DataFrame from polling results
-            df_polling_results = pd.DataFrame(polling_results).T.reset_index().rename(columns={'index': 'state'})
-
-            # Fix state names
-            df_polling_results['state'] = df_polling_results['state'].apply(fix_state_name)
-
-            # Merge geopandas DataFrame with polling results
-            merged_states = us_states.set_index('State_Name').join(df_polling_results.set_index('state'))
-
-            # Create a map
-            fig, axes = plt.subplots(2, figsize=(16, 16), gridspec_kw={'height_ratios': [1, 5]})
-            # Adjust subplot parameters to reduce side margins
-            plt.subplots_adjust(left=0.05, right=0.95)
-            stretch_amount = 2.5
-
-            # Create a rectangle with the desired color and transparency
-            rectangle = patches.Rectangle(
-                (merged_states.total_bounds[0] - stretch_amount, merged_states.total_bounds[1] - stretch_amount),
-                merged_states.total_bounds[2] - merged_states.total_bounds[0] + stretch_amount * 2,
-                merged_states.total_bounds[3] - merged_states.total_bounds[1] + stretch_amount * 2, facecolor=BOX_COLOR,
-                alpha=BOX_TRANSPARENCY, zorder=-3)
-            # Add the rectangle to the axes for the map
-            axes[1].add_patch(rectangle)
-            # Create outer rectangle with the desired color and transparency
-            rectangle = patches.Rectangle(
-                (merged_states.total_bounds[0] - stretch_amount, merged_states.total_bounds[1] - stretch_amount),
-                merged_states.total_bounds[2] - merged_states.total_bounds[0] + stretch_amount * 2,
-                merged_states.total_bounds[3] - merged_states.total_bounds[1] + stretch_amount * 2, facecolor='black',
-                alpha=0.8, fill=False, zorder=-1, linewidth=1.5)
-            # Add the rectangle to the axes for the map
-            axes[1].add_patch(rectangle)
-
-            harris_states = merged_states.loc[(merged_states['winner'] == 'Harris')]
-            trump_states = merged_states.loc[(merged_states['winner'] == 'Trump')]
-
-            # Function to get color for each state
-            def get_state_color(state):
-
-                # create point_diff to color mapping
-                def map_value_to_color(x):
-                    if x <= 2000:
-                        return x / 3333.33  # Maps 0-2000 (pd of 0-20) to 0-0.6
-                    elif x <= 2500:
-                        return 0.6 + (x - 2000) / 5000  # Maps 2001-2500 (pd of 20-25) to 0.6-0.7
-                    else:
-                        return 0.7 + (x - 2500) / 24997  # Maps 2501-9999 (pd of 25 to 100) to 0.7-1
-
-                if state in harris_states.index:
-                    return color_maps[1](map_value_to_color(harris_states.loc[state, 'point_diff'] * 100))
-                if state in trump_states.index:
-                    return color_maps[0](map_value_to_color(trump_states.loc[state, 'point_diff'] * 100))
-                print(f'Warning: {state} not found in either harris_states or trump_states')
-                return 'white'
-
-            # Apply the color to each state in the DataFrame
-            harris_states.loc[:, 'color'] = harris_states.index.map(get_state_color)
-            trump_states.loc[:, 'color'] = trump_states.index.map(get_state_color)
-
-            # Plot the states with the specified colors
-            harris_states.plot(color=harris_states['color'], linewidth=0.8, ax=axes[1], edgecolor='0.8', zorder=5)
-            trump_states.plot(color=trump_states['color'], linewidth=0.8, ax=axes[1], edgecolor='0.8', zorder=5)
-
-            # remove the axes labels from the map
-            axes[1].axis('off')
-
-            # states_of_interest = ['ARIZONA', 'MICHIGAN', 'FLORIDA', 'WISCONSIN', "NEW YORK", "COLORADO"]
-            # print(f'Polling results for {filename}:')
-            # for state in states_of_interest:
-            #     print(f'{state}: {merged_states.loc[state, "winner"]}, by {merged_states.loc[state, "point_diff"]}')
-            # print("")
-
-            # Plot the horizontal bar chart
             with open(os.path.join(elec_votes_dir, filename.replace('polling_results', 'electoral_votes'))) as file:
                 electoral_vote_counts = json.load(file)
-            plot_horizontal_bar(fig, axes[0], electoral_vote_counts['Trump'], electoral_vote_counts['Harris'])
-
-            # Load the image
-            img = mpimg.imread(f'{SOURCE_IMAGES_DIR}/{BACKGROUND_IMAGE}')
+            yield filename, polling_results, electoral_vote_counts
+
+
+# Where a state's point difference falls on its color map: 0-20 points covers 0-0.6, 20-25 covers 0.6-0.7, and 25-100
+# covers the rest. Works on single values and on arrays.
+def point_diff_to_color_value(point_diff):
+    x = np.asarray(point_diff, dtype=float) * 100
+    return np.where(x <= 2000, x / 3333.33,
+                    np.where(x <= 2500, 0.6 + (x - 2000) / 5000, 0.7 + (x - 2500) / 24997))
+
+
+# Draws the daily map figure once and then redraws it for any day by changing only what differs between days: the
+# state fill colors, the bar and its labels, and the title. Everything that never changes (the background image and
+# the boxes around the bar and title) is drawn once and kept as pixels, and each day only the artists that change are
+# drawn on top of a copy of it.
+class MapRenderer:
+
+    def __init__(self, color_maps):
+        self.color_maps = color_maps
+
+        # Set default font
+        plt.rcParams['font.size'] = 22
+        plt.rcParams['font.weight'] = 'bold'
+        plt.rcParams['axes.labelweight'] = 'bold'
+
+        # Load US states, with Hawaii and Alaska moved under the lower 48
+        us_states = load_us_states()
+        self.state_keys = [name.lower().replace(' ', '-') for name in us_states['State_Name']]
+
+        # Create a map
+        self.fig = Figure(figsize=(16, 16))
+        FigureCanvasAgg(self.fig)
+        axes = self.fig.subplots(2, gridspec_kw={'height_ratios': [1, 5]})
+        # Adjust subplot parameters to reduce side margins
+        self.fig.subplots_adjust(left=0.05, right=0.95)
+        stretch_amount = 2.5
+        bounds = us_states.total_bounds
+
+        # Create a rectangle with the desired color and transparency
+        rectangle = patches.Rectangle(
+            (bounds[0] - stretch_amount, bounds[1] - stretch_amount),
+            bounds[2] - bounds[0] + stretch_amount * 2,
+            bounds[3] - bounds[1] + stretch_amount * 2, facecolor=BOX_COLOR,
+            alpha=BOX_TRANSPARENCY, zorder=-3)
+        # Add the rectangle to the axes for the map
+        axes[1].add_patch(rectangle)
+        # Create outer rectangle with the desired color and transparency
+        rectangle = patches.Rectangle(
+            (bounds[0] - stretch_amount, bounds[1] - stretch_amount),
+            bounds[2] - bounds[0] + stretch_amount * 2,
+            bounds[3] - bounds[1] + stretch_amount * 2, facecolor='black',
+            alpha=0.8, fill=False, zorder=-1, linewidth=1.5)
+        # Add the rectangle to the axes for the map
+        axes[1].add_patch(rectangle)
+
+        # Plot every state twice, once for Harris and then once for Trump, so Harris' states are drawn first as they
+        # always were; each day only the fill colors change, with the other candidate's states left transparent.
+        # geopandas draws a multi-part state as one polygon per part, so keep track of which state each polygon is.
+        us_states.plot(ax=axes[1], color='white', linewidth=0.8, edgecolor='0.8', zorder=5)
+        us_states.plot(ax=axes[1], color='white', linewidth=0.8, edgecolor='0.8', zorder=5)
+        self.harris_states, self.trump_states = axes[1].collections[-2:]
+        parts = shapely.get_num_geometries(us_states.geometry.values)
+        self.polygon_states = np.repeat(np.arange(len(us_states)), parts if parts.sum() == len(
+            self.harris_states.get_paths()) else 1)
+        self.edge_color = to_rgba('0.8')
+        self.map_ax = axes[1]
+        self.state_bounds = shapely.bounds(us_states.geometry.values)
+        self.geographic = us_states.crs is not None and us_states.crs.is_geographic
+
+        # remove the axes labels from the map
+        axes[1].axis('off')
+
+        # Plot the horizontal bar chart
+        self.bar_ax = axes[0]
+        plot_horizontal_bar(self.fig, self.bar_ax, 0, 0)
+
+        # Load the image
+        img = mpimg.imread(f'{SOURCE_IMAGES_DIR}/{BACKGROUND_IMAGE}')
+
+        background_ax = self.fig.add_axes((0, 0, 1, 1))  # create a dummy subplot for the background
+        background_ax.set_zorder(-5)  # set the background subplot behind the others
+        background_ax.imshow(img, aspect='auto')  # show the background image
+
+        # Set the title of the figure
+        self.title = None
+        if ADD_TITLE:
+            self.title = self.fig.suptitle('', fontsize=25, weight='semibold', y=0.95)
+            self.fig.patches.extend([plt.Rectangle((0.03, 0.92), 0.94, 0.05,
+                                                   fill=True, color=BOX_COLOR, alpha=BOX_TRANSPARENCY, zorder=-3,
+                                                   transform=self.fig.transFigure, figure=self.fig)])
+            self.fig.patches.extend([plt.Rectangle((0.03, 0.92), 0.94, 0.05,
+                                                   fill=False, color='black', alpha=0.8, zorder=-1,
+                                                   transform=self.fig.transFigure, figure=self.fig, linewidth=1.5)])
+
+        # the artists redrawn for every day, in the order a full draw of the figure would draw them. The map's boxes
+        # are among them as the map's aspect, and so where they land, can change from day to day.
+        self.changing_artists = (self.map_ax.patches[:2] + [self.harris_states, self.trump_states]
+                                 + self.bar_ax.patches[:2] + self.bar_ax.texts[:2] + self.bar_ax.lines[:1]
+                                 + ([self.title] if self.title is not None else []))
+        self.static_layer = None
+
+    # The fill color of every state, as RGBA rows in shapefile order, and which states Trump won. States missing from
+    # the polling results are left out of the map, as they always have been.
+    def state_colors(self, polling_results):
+        results = [polling_results.get(state) for state in self.state_keys]
+        winners = np.array([result['winner'] if result else '' for result in results])
+        point_diffs = np.array([result['point_diff'] if result else 0 for result in results], dtype=float)
+        trump_won = winners == 'Trump'
+        harris_won = winners == 'Harris'
+
+        colors = np.zeros((len(self.state_keys), 4))
+        color_values = point_diff_to_color_value(point_diffs)
+        colors[trump_won] = self.color_maps[0](color_values[trump_won])
+        colors[harris_won] = self.color_maps[1](color_values[harris_won])
+        return colors, trump_won
+
+    # geopandas sets the aspect of a geographic map from the middle latitude of whatever it plotted last, which used
+    # to be Trump's states (or Harris' if Trump had none), so the map's shape shifts a little from day to day
+    def set_map_aspect(self, colors, trump_won):
+        if not self.geographic:
+            return
+        last_plotted = trump_won if trump_won.any() else colors[:, 3] > 0
+        if not last_plotted.any():
+            return
+        bounds = self.state_bounds[last_plotted]
+        y_coord = np.mean([bounds[:, 1].min(), bounds[:, 3].max()])
+        self.map_ax.set_aspect(1 / np.cos(y_coord * np.pi / 180))
+
+    # Set the figure up for one day (or transition frame) and return it
+    def render(self, polling_results, electoral_vote_counts, date):
+        state_colors, trump_won = self.state_colors(polling_results)
+        self.set_map_aspect(state_colors, trump_won)
+        colors = state_colors[self.polygon_states]
+        trump_won = trump_won[self.polygon_states]
+        drawn = colors[:, 3] > 0
+        for collection, shown in ((self.harris_states, drawn & ~trump_won), (self.trump_states, trump_won)):
+            face_colors = np.zeros_like(colors)
+            face_colors[shown] = colors[shown]
+            edge_colors = np.zeros_like(colors)
+            edge_colors[shown] = self.edge_color
+            collection.set_facecolor(face_colors)
+            collection.set_edgecolor(edge_colors)
+
+        update_horizontal_bar(self.bar_ax, electoral_vote_counts['Trump'], electoral_vote_counts['Harris'])
+
+        if self.title is not None:
+            self.title.set_text(f'2024 election outcome based on most recent polling as of {write_out_date(date)}')
+        return self.fig
+
+    # Draw the figure as last set up by render and return its pixels (height x width x RGBA)
+    def draw(self):
+        canvas = self.fig.canvas
+        if self.static_layer is None:
+            for artist in self.changing_artists:
+                artist.set_animated(True)
+            canvas.draw()
+            self.static_layer = canvas.copy_from_bbox(self.fig.bbox)
+            for artist in self.changing_artists:
+                artist.set_animated(False)
+
+        canvas.restore_region(self.static_layer)
+        # a full draw would fit the map to its aspect first
+        self.map_ax.apply_aspect()
+        for artist in self.changing_artists:
+            self.fig.draw_artist(artist)
+        return np.asarray(canvas.buffer_rgba())
+
+    # Draw and encode the figure once, saving it to the first path given and copying it to the rest. The first is written
+    # whole and renamed into place rather than rewritten, as the rest may be hard links to it.
+    def save(self, *paths):
+        with AtomicPath(paths[0], suffix='.png') as tmp_path:
+            mpimg.imsave(tmp_path, self.draw(), dpi=self.fig.dpi)
+        for path in paths[1:]:
+            link_or_copy(paths[0], path)
+
+
+_renderers = {}  # color map names -> MapRenderer, so repeated calls to main in one process share a figure
+
+
+def get_renderer(color_maps):
+    key = tuple(color_map.name for color_map in color_maps)
+    if key not in _renderers:
+        _renderers[key] = MapRenderer(color_maps)
+    return _renderers[key]
+
+
+# Render one day's map and save it to each output directory. Runs in a parallel_render worker when rendering in
+# parallel, each of which keeps its own renderer.
+def render_day(task):
+    filename, polling_results, electoral_vote_counts, out_dirs, color_maps = task
+    date = filename.split('_')[-1].split('.')[0]
+    renderer = get_renderer(color_maps)
+    renderer.render(polling_results, electoral_vote_counts, date)
+    renderer.save(*[os.path.join(output_dir, f'{filename[:-5]}.png') for output_dir in out_dirs])
+    return filename
+
+
+# Render one day's map and return its image file name with the map as an RGBA array, or as the bytes of an image file
+# if given a format like 'png'. Runs in a parallel_render worker when rendering in parallel.
+def render_day_frame(task):
+    filename, polling_results, electoral_vote_counts, color_maps, image_format = task
+    date = filename.split('_')[-1].split('.')[0]
+    renderer = get_renderer(color_maps)
+    renderer.render(polling_results, electoral_vote_counts, date)
+    if image_format is None:
+        # the renderer draws the next day over the same buffer
+        return f'{filename[:-5]}.png', np.array(renderer.draw())
+    buffer = io.BytesIO()
+    mpimg.imsave(buffer, renderer.draw(), format=image_format, dpi=renderer.fig.dpi)
+    return f'{filename[:-5]}.png', buffer.getvalue()
+
+
+# Yield (image file name, frame) for every day's map, one at a time and in order, without saving anything. Every map is
+# drawn on the same figure, so memory use stays the same however many are rendered.
+def render_frames(poll_res_dir=POLLING_RESULTS_DIR, elec_votes_dir=ELECTORAL_VOTE_COUNTS_DIR, color_maps=None,
+                  dates=None, workers=1, image_format=None):
+    tasks = ((filename, polling_results, electoral_vote_counts, color_maps, image_format)
+             for filename, polling_results, electoral_vote_counts in load_days(poll_res_dir, elec_votes_dir, dates))
+    yield from ordered_map(render_day_frame, tasks, workers, RENDER_MAX_FRAMES_IN_FLIGHT,
+                           initializer=get_renderer, initargs=(color_maps,))
 
-            background_ax = plt.axes((0, 0, 1, 1))  # create a dummy subplot for the background
-            background_ax.set_zorder(-5)  # set the background subplot behind the others
-            background_ax.imshow(img, aspect='auto')  # show the background image
 
-            # Set the title of the figure
-            date = filename.split('_')[-1].split('.')[0]
-            if ADD_TITLE:
-                fig.suptitle(f'2024 election outcome based on most recent polling as of {write_out_date(date)}',
-                             fontsize=25, weight='semibold', y=0.95)
-                fig.patches.extend([plt.Rectangle((0.03, 0.92), 0.94, 0.05,
-                                                  fill=True, color=BOX_COLOR, alpha=BOX_TRANSPARENCY, zorder=-3,
-                                                  transform=fig.transFigure, figure=fig)])
-                fig.patches.extend([plt.Rectangle((0.03, 0.92), 0.94, 0.05,
-                                                  fill=False, color='black', alpha=0.8, zorder=-1,
-                                                  transform=fig.transFigure, figure=fig, linewidth=1.5)])
-
-            if return_not_save:
-                result.append([fig, f'{filename[:-5]}.png'])
-                continue
+def main(poll_res_dir=POLLING_RESULTS_DIR, elec_votes_dir=ELECTORAL_VOTE_COUNTS_DIR, out_dirs=None,
+         color_maps=None, dates=None, workers=1):
+    if out_dirs is None:
+        out_dirs = [DAILY_MAPS_DIR]
 
-            # Save the map
-            for output_dir in out_dirs:
-                fig.savefig(os.path.join(output_dir, f'{filename[:-5]}.png'))
+    for output_dir in out_dirs:
+        os.makedirs(output_dir, exist_ok=True)
 
-            plt.close(fig)
+    days = load_days(poll_res_dir, elec_votes_dir, dates)
 
-    if return_not_save:
-        return result
+    tasks = ((filename, polling_results, electoral_vote_counts, out_dirs, color_maps)
+             for filename, polling_results, electoral_vote_counts in days)
+    for _ in ordered_map(render_day, tasks, workers, RENDER_MAX_FRAMES_IN_FLIGHT,
+                         initializer=get_renderer, initargs=(color_maps,)):
+        pass
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render a map for every day of polling results.')
+    parser.add_argument('--workers', type=int, default=RENDER_WORKERS, help='number of processes rendering maps')
+    args = parser.parse_args()
+
     cmap_r = plt.colormaps['Reds']
     cmap_b = plt.colormaps['Blues']
     map_color_maps = (cmap_r, cmap_b)
-    main(color_maps=map_color_maps)
+    main(color_maps=map_color_maps, workers=args.workers)
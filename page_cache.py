@@ -0,0 +1,119 @@
+# gzip-compressed snapshots of every 538 state page simulate.py reads, so a day's scrape can be replayed offline.
+# Snapshots are stored once per distinct page content under PAGE_SNAPSHOTS_DIR/blobs, named by the sha256 of the HTML,
+# and a small index per scrape date maps each state and search query to the blob it saw.
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from atomic_file import atomic_write
+from constants import PAGE_SNAPSHOTS_DIR
+
+BLOBS_DIR = os.path.join(PAGE_SNAPSHOTS_DIR, 'blobs')
+INDEX_DIR = os.path.join(PAGE_SNAPSHOTS_DIR, 'index')
+
+DEFAULT_QUERY = 'harris trump'
+
+_index_lock = threading.Lock()
+
+
+def blob_path(digest):
+    return os.path.join(BLOBS_DIR, digest[:2], f'{digest}.html.gz')
+
+
+def index_path(date):
+    return os.path.join(INDEX_DIR, f'{date}.json')
+
+
+def load_index(date):
+    try:
+        with open(index_path(date)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+# Store the HTML of a page read for the given state on the given date (YYYY-MM-DD) with the given search query.
+# Returns the content hash the snapshot was stored under.
+def save_snapshot(state, date, query, html):
+    data = html.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()
+    if not os.path.exists(blob_path(digest)):
+        atomic_write(blob_path(digest), gzip.compress(data))
+
+    with _index_lock:
+        index = load_index(date)
+        index.setdefault(state, {})[query] = digest
+        atomic_write(index_path(date), json.dumps(index, indent=1, sort_keys=True).encode('utf-8'))
+    return digest
+
+
+# Returns the HTML stored for the given state, date and search query, or None if that page was never captured.
+def load_snapshot(state, date, query):
+    digest = load_index(date).get(state, {}).get(query)
+    if digest is None:
+        return None
+    with gzip.open(blob_path(digest), 'rb') as f:
+        return f.read().decode('utf-8')
+
+
+def snapshot_dates():
+    if not os.path.isdir(INDEX_DIR):
+        return []
+    return sorted(fn[:-len('.json')] for fn in os.listdir(INDEX_DIR) if fn.endswith('.json'))
+
+
+# A stand-in for projects.fivethirtyeight.com/polls serving the pages captured on one date, so the live scraping path
+# (browser, readiness waits, page_source) can be exercised offline. GET /polls/<state> serves the Harris/Trump page,
+# and GET /polls/<state>?q=<query> the page captured for any other search query.
+def make_fixture_handler(date):
+
+    class SnapshotHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [part for part in url.path.split('/') if part]
+            query = parse_qs(url.query).get('q', [DEFAULT_QUERY])[0]
+            html = load_snapshot(parts[-1], date, query) if len(parts) == 2 and parts[0] == 'polls' else None
+            if html is None:
+                self.send_error(404, f'No snapshot of {url.path} for {query!r} on {date}')
+                return
+            body = html.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return SnapshotHandler
+
+
+def serve_snapshots(date, port=8538):
+    server = ThreadingHTTPServer(('localhost', port), make_fixture_handler(date))
+    print(f'Serving 538 snapshots from {date} at http://localhost:{port}/polls/<state>')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve or list captured 538 state pages.')
+    parser.add_argument('date', nargs='?', help='scrape date (YYYY-MM-DD) to serve; lists captured dates if omitted')
+    parser.add_argument('--port', type=int, default=8538)
+    args = parser.parse_args()
+    if args.date:
+        serve_snapshots(args.date, args.port)
+    else:
+        for captured_date in snapshot_dates():
+            print(captured_date)
@@ -0,0 +1,49 @@
+# spreads rendering over a pool of worker processes while handing the results back strictly in order.
+#
+# Each worker process keeps whatever it warms up (the cached state geometry, a map.MapRenderer's figure, a
+# frame_compositor.FrameCompositor's layers) for every task it is given. Results that finish out of order wait in a
+# reorder buffer until everything before them has been handed on, and no more than max_in_flight tasks are ever
+# submitted but not yet handed on, which bounds how many rendered frames are held in memory at once.
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+
+# Yield fn(item) for every item, in order. With one worker everything runs in this process.
+def ordered_map(fn, items, workers, max_in_flight, initializer=None, initargs=()):
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield fn(item)
+        return
+
+    items = iter(items)
+    pool = ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs)
+    pending = {}  # future -> index of its item
+    reorder_buffer = {}  # index -> result, for results that finished before an earlier one
+    submitted = handed_on = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and submitted - handed_on < max(max_in_flight, 1):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(fn, item)] = submitted
+                submitted += 1
+
+            if handed_on == submitted:
+                return
+
+            if handed_on not in reorder_buffer:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    reorder_buffer[pending.pop(future)] = future.result()
+                continue
+
+            yield reorder_buffer.pop(handed_on)
+            handed_on += 1
+    finally:
+        pool.shutdown(cancel_futures=True)
@@ -1,17 +1,17 @@
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 from matplotlib import rcParams, image as mpimg
 from matplotlib.lines import Line2D
 import matplotlib.patheffects as pe
-import os
-import json
 import numpy as np
 from scipy.interpolate import interp1d
 
+from fan_out import fan_out
 from map import write_out_date as write_out_date_map
+from history_store import load_history
+from video_encoder import VideoEncoder
 
-from constants import ELECTORAL_VOTE_COUNTS_DIR, FINAL_VIDEOS_DIR, SOURCE_IMAGES_DIR, BOX_COLOR, BOX_TRANSPARENCY, \
-    DAILY_PLOTS_DIR, PLOT_LAST_N_ONLY, GOOGLE_DRIVE_UPLOAD_PATH, BACKGROUND_IMAGE, SAVE_TO_GOOGLE_DRIVE, ADD_TITLE, \
+from constants import FINAL_VIDEOS_DIR, SOURCE_IMAGES_DIR, BOX_COLOR, BOX_TRANSPARENCY, \
+    DAILY_PLOTS_DIR, PLOT_LAST_N_ONLY, BACKGROUND_IMAGE, ADD_TITLE, \
     FINAL_HOLD_IN_SECONDS, FRAMES_PER_SECOND, FRAMES_PER_DAY
 
 
@@ -28,9 +28,6 @@ def write_out_date(filename):
 
 fps = FRAMES_PER_SECOND  # Increase frames per second for smoother animation
 
-# Set the path to ffmpeg
-rcParams['animation.ffmpeg_path'] = r'C:\Users\philh\ffmpeg\bin\ffmpeg.exe'
-
 # Set default font
 rcParams['font.size'] = 16
 rcParams['font.weight'] = 'bold'
@@ -39,21 +36,15 @@ rcParams['axes.labelweight'] = 'bold'
 print("Gathering data...")
 
 # Get all electoral vote counts available
-electoral_vote_counts = []
-files = os.listdir(ELECTORAL_VOTE_COUNTS_DIR)
-files.sort(key=lambda x: os.path.getmtime(os.path.join(ELECTORAL_VOTE_COUNTS_DIR, x)))
+history = load_history()
+files = history.dates  # dates in YYYY-MM-DD form, which the write_out_date functions read like file names
 
 if PLOT_LAST_N_ONLY:
     files = files[-PLOT_LAST_N_ONLY:]  # Only use the last 7 days
 
-for f in files:
-    if f.endswith('.json'):
-        with open(os.path.join(ELECTORAL_VOTE_COUNTS_DIR, f), 'r') as file:
-            electoral_vote_counts.append(json.load(file))
-
 # Create result list for each candidate
-harris = [r['Harris'] for r in electoral_vote_counts]
-trump = [r['Trump'] for r in electoral_vote_counts]
+harris = history.harris_votes[len(history) - len(files):].tolist()
+trump = history.trump_votes[len(history) - len(files):].tolist()
 
 print("Creating plots...")
 
@@ -141,15 +132,20 @@ background_ax.imshow(img, aspect='auto')  # show the background image
 
 print("Generating animation...")
 
-ani = animation.FuncAnimation(fig, animate, init_func=init, frames=frames + hold_frames, interval=1000/fps, blit=True)
-
-
-# Save the animation as a video file
+# Draw each frame and pipe it straight into ffmpeg
 print(f"Saving animation to {FINAL_VIDEOS_DIR}/plots/{write_out_date(files[0])}_to_{write_out_date(files[-1])}_line.mp4")
-ani.save(f'{FINAL_VIDEOS_DIR}/plots/{write_out_date(files[0])}_to_{write_out_date(files[-1])}_line.mp4', writer='ffmpeg')
-if SAVE_TO_GOOGLE_DRIVE:
-    print(f"Saving animation to {GOOGLE_DRIVE_UPLOAD_PATH}/{write_out_date(files[0])}_to_{write_out_date(files[-1])}_line.mp4")
-    ani.save(f'{GOOGLE_DRIVE_UPLOAD_PATH}/{write_out_date(files[0])}_to_{write_out_date(files[-1])}_line.mp4', writer='ffmpeg')
+canvas = fig.canvas
+canvas.draw()
+with VideoEncoder(f'{FINAL_VIDEOS_DIR}/plots/{write_out_date(files[0])}_to_{write_out_date(files[-1])}_line.mp4',
+                  canvas.get_width_height(), fps, pixel_format='rgba') as video:
+    init()
+    for i in range(frames + hold_frames):
+        # the held frames at the end are all the same as the last one drawn
+        if i <= frames:
+            animate(i)
+            canvas.draw()
+        video.write(np.asarray(canvas.buffer_rgba()))
+fan_out(video.path)
 
 #
 # create a single image plot of the data
@@ -2,17 +2,29 @@
 # recent polling match up between Trump and Harris. If there is none, try Trump and Biden. If nothing there, use 2020
 # results.
 
+import argparse
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime, timedelta
+from urllib.parse import quote
 
-from selenium import webdriver
-from selenium.common.exceptions import StaleElementReferenceException
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
 from pprint import pprint
 import time
 
+import lxml.html
+
+from checkpoint import StateCheckpoint
+from history_store import append_day
+from forecast import electoral_vote_distribution, harris_wins, states_given, tally_harris_wins
+from page_cache import load_index, load_snapshot, save_snapshot
+from driver_pool import DriverPool, create_driver, wait_for_polls, wait_for_search_box
 from constants import (
-    STATE_AND_THEIR_ELECTORAL_VOTES, STATES_AND_2020_OUTCOME, POLLING_RESULTS_DIR, ELECTORAL_VOTE_COUNTS_DIR
+    STATE_AND_THEIR_ELECTORAL_VOTES, STATES_AND_2020_OUTCOME, POLLING_RESULTS_DIR, ELECTORAL_VOTE_COUNTS_DIR,
+    SCRAPE_WORKERS, SAVE_PAGE_SNAPSHOTS, LIVE_POLLS_URL, POLLS_URL, SCRAPE_MAX_ATTEMPTS, SCRAPE_BACKOFF_SECONDS,
+    SCRAPE_MAX_BACKOFF_SECONDS
 )
 
 
@@ -20,13 +32,14 @@ def fix_state_name(s):
     return s.replace('-', ' ').title()
 
 
-def contains_our_candidates(cells, dem='Harris'):
+# answers holds the text of each answer cell in a poll row, e.g. ['Harris 47%', 'Trump 45%']
+def contains_our_candidates(answers, dem='Harris'):
     found_trump = False
     found_dem = False
-    for cell in cells:
-        if 'Trump' in cell.text:
+    for answer in answers:
+        if 'Trump' in answer:
             found_trump = True
-        if dem in cell.text:
+        if dem in answer:
             found_dem = True
     return found_trump and found_dem
 
@@ -35,13 +48,13 @@ def get_point_diff(r):
     return int(r.find_element(By.CLASS_NAME, 'net').text.strip())
 
 
-def parse_date_string(date_string):
+def parse_date_string(date_string, today=None):
     if date_string.startswith('Polls ending '):
         date_string = date_string.replace('Polls ending ', '')
     if 'Sept' in date_string:
         date_string = date_string.replace('Sept', 'Sep')
     if date_string == 'today':
-        return datetime.now().date()
+        return today or datetime.now().date()
     try:
         cur_date = datetime.strptime(date_string, '%B %d, %Y').date()
     except ValueError:
@@ -53,13 +66,14 @@ def parse_date_string(date_string):
     return cur_date
 
 
-def gather_results(polls_counted, dem_total, s, dem, return_first, weeks_back):
+def gather_results(polls_counted, dem_total, rows, s, dem, return_first, weeks_back, today):
     if polls_counted > 0:
         if dem_total == 0:  # it's a tie
             if not return_first:
                 print(f"Tie in {fix_state_name(s)} after averaging {polls_counted} poll"
                       f"{'' if polls_counted == 1 else 's'}. Trying just the most recent poll...")
-                return find_polled_winner(s, dem=dem, return_first=True, weeks_back=weeks_back)
+                return find_polled_winner(s, dem=dem, return_first=True, weeks_back=weeks_back, rows=rows,
+                                          today=today)
             else:  # we tried returning the first poll, but no poll with a winner was found
                 return None, None
         else:  # we have a winner
@@ -69,80 +83,166 @@ def gather_results(polls_counted, dem_total, s, dem, return_first, weeks_back):
         return None, None  # no poll with a winner was found in given time frame
 
 
+# Load the fivethirtyeight.com page for the given state, searched for the given Democratic candidate against Trump,
+# and wait until the list of polls is on the page.
+def load_state_page(s, dem, driver):
+    search_text = f'{dem} trump'
+    url = f'{POLLS_URL}/{s}'
+    if POLLS_URL != LIVE_POLLS_URL:  # a page_cache fixture server, which can't see what we type in the search box
+        url += f'?q={quote(search_text.lower())}'
+    driver.get(url)
+    search = wait_for_search_box(driver)
+    search.send_keys(search_text)
+    return wait_for_polls(driver)
+
+
+def has_class(class_name, axis='.//*'):
+    return f"{axis}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+
+
+def first_text(element, class_name):
+    matches = element.xpath(has_class(class_name))
+    return matches[0].text_content().strip() if matches else ''
+
+
+# Read every 2024 poll row out of the HTML of a loaded state page. Returns one dict per poll row, newest first, holding
+# the date of the poll group it was listed under (None if no date could be parsed), the leader's name ('' for a tied
+# poll), the net margin and the text of the answer cells used to tell which pairing the poll was for. today is the date
+# the page was captured on, used for polls listed as ending 'today'.
+def parse_poll_rows(html, today=None):
+    page = lxml.html.fromstring(html)
+    polls = page.xpath(has_class('polls', axis='descendant-or-self::*'))
+    if not polls:
+        return []
+
+    poll_rows = []
+    cur_date = None
+
+    for child in polls[0].iterdescendants():
+        if not isinstance(child.tag, str):  # skip comments
+            continue
+
+        if child.get('class') == 'day-container':
+
+            header_text = first_text(child, 'poll-group-hed')
+            if '2024' not in header_text:  # skip polls not for 2024 election
+                continue
+
+            for row in child.xpath(has_class('visible-row')):
+                w = first_text(row, 'leader')
+                poll_rows.append({
+                    'date': cur_date,
+                    'leader': w,
+                    'net': int(first_text(row, 'net')) if w else 0,
+                    'answers': [' '.join(cell.text_content().split()) for cell in row.xpath(has_class('answer'))],
+                })
+
+        if child.get('class') == 'date':
+            cur_date = parse_date_string(child.text_content().strip(), today)
+
+    return poll_rows
+
+
+# The original extraction, walking the poll list one WebDriver call per element. Much slower than parse_poll_rows, and
+# kept so benchmark_extraction.py can check the two against each other on live pages.
+def walk_poll_rows(polls):
+    polls_children = polls.find_elements(By.XPATH, ".//*")
+
+    poll_rows = []
+    cur_date = None
+
+    for child in polls_children:
+        if child.get_attribute('class') == 'day-container':
+
+            header_text = child.find_element(By.CLASS_NAME, 'poll-group-hed').text.strip()
+            if '2024' not in header_text:  # skip polls not for 2024 election
+                continue
+
+            rows = child.find_elements(By.CLASS_NAME, 'visible-row')
+            for row in rows:
+                w = row.find_element(By.CLASS_NAME, 'leader').text.strip()
+                poll_rows.append({
+                    'date': cur_date,
+                    'leader': w,
+                    'net': get_point_diff(row) if w else 0,
+                    'answers': [cell.text for cell in row.find_elements(By.CLASS_NAME, 'answer')],
+                })
+
+        if child.get_attribute('class') == 'date':
+            cur_date = parse_date_string(child.text.strip())
+
+    return poll_rows
+
+
+# Load the page for the given state once and read all of its 2024 polls for the given pairing with parse_poll_rows,
+# using a single page_source call rather than a WebDriver round trip per element. Every page read is saved with
+# page_cache under the scrape date (today). With replay=True no browser is used and the rows are read from the page
+# saved for that date instead; a page that was not saved is an error, as the live scrape would have read it.
+def fetch_poll_rows(s, dem='Harris', driver=None, today=None, replay=False):
+    if today is None:
+        today = datetime.now().date()
+    query = f'{dem} trump'.lower()
+
+    if replay:
+        html = load_snapshot(s, today.isoformat(), query)
+        if html is None:
+            raise FileNotFoundError(f'No saved {dem}/Trump page for {fix_state_name(s)} on {today.isoformat()}, so '
+                                    f'its polling results cannot be replayed')
+        return parse_poll_rows(html, today)
+
+    if driver is None:
+        driver = create_driver()
+        try:
+            return fetch_poll_rows(s, dem, driver=driver, today=today)
+        finally:
+            driver.quit()
+
+    load_state_page(s, dem, driver)
+    html = driver.page_source
+    if SAVE_PAGE_SNAPSHOTS:
+        save_snapshot(s, today.isoformat(), query, html)
+    poll_rows = parse_poll_rows(html, today)
+
+    print(f"Read {len(poll_rows)} {dem}/Trump poll{'' if len(poll_rows) == 1 else 's'} for {fix_state_name(s)}")
+    return poll_rows
+
+
 # Average polling results from the past week for the given state, as taken from fivethirtyeight.com, between
 # Trump and the given Democratic candidate. If the average is a tie, return the winner of the most recent poll.
-# Returns the winner and the average point differential.
-def find_polled_winner(s, dem='Harris', return_first=False, weeks_back=1):
-    try:
-        url = f'https://projects.fivethirtyeight.com/polls/{s}'
-        options = webdriver.ChromeOptions()
-        options.add_argument("--headless=new")
-        driver = webdriver.Chrome(options=options)
-        driver.get(url)
-        time.sleep(2)
-        search_text = f'{dem} trump'
-        search = driver.find_element(By.ID, 'search-box')
-        search.send_keys(search_text)
-        polls = driver.find_element(By.CLASS_NAME, 'polls')
-        polls_children = polls.find_elements(By.XPATH, ".//*")
-
-        dem_total = 0
-        polls_counted = 0
-
-        min_date = datetime.now().date() - timedelta(weeks=weeks_back)
-
-        for child in polls_children:
-            if child.get_attribute('class') == 'day-container':
-
-                header_text = child.find_element(By.CLASS_NAME, 'poll-group-hed').text.strip()
-                if '2024' not in header_text:  # skip polls not for 2024 election
-                    continue
-
-                rows = child.find_elements(By.CLASS_NAME, 'visible-row')
-                for row in rows:
-                    cells = row.find_elements(By.CLASS_NAME, 'answer')
-                    if contains_our_candidates(cells, dem=dem):
-                        polls_counted += 1
-                        w = row.find_element(By.CLASS_NAME, 'leader').text.strip()
-                        if w:
-                            point_diff = get_point_diff(row)
-                            if return_first:
-                                return w, point_diff
-                            if w == 'Trump':
-                                dem_total -= point_diff
-                            else:
-                                dem_total += point_diff
-
-            if child.get_attribute('class') == 'date':
-
-                # check which date we're on
-                date_string = child.text.strip()
-                cur_date = parse_date_string(date_string)
-
-                if cur_date and cur_date >= min_date:
-                    print(f"Checking polls from {date_string} for {fix_state_name(s)}...")
-                    continue
+# Returns the winner and the average point differential. The polls are read from rows as returned by fetch_poll_rows,
+# which are fetched first if not given, so the whole fallback ladder for a state can run against a single page load.
+def find_polled_winner(s, dem='Harris', return_first=False, weeks_back=1, rows=None, driver=None, today=None):
+    if today is None:
+        today = datetime.now().date()
+    if rows is None:
+        rows = fetch_poll_rows(s, dem, driver=driver, today=today)
+
+    dem_total = 0
+    polls_counted = 0
+
+    min_date = today - timedelta(weeks=weeks_back)
+
+    for row in rows:
+        if row['date'] and row['date'] < min_date:  # we're done
+            break
+        if contains_our_candidates(row['answers'], dem=dem):
+            polls_counted += 1
+            w = row['leader']
+            if w:
+                point_diff = row['net']
+                if return_first:
+                    return w, point_diff
+                if w == 'Trump':
+                    dem_total -= point_diff
                 else:
-                    if cur_date and cur_date < min_date:  # we're done
-                        return gather_results(polls_counted, dem_total, s, dem, return_first, weeks_back)
-
-        # for case when last poll is within our time frame
-        return gather_results(polls_counted, dem_total, s, dem, return_first, weeks_back)
+                    dem_total += point_diff
 
-    except StaleElementReferenceException:
-        print(f"Stale element reference exception for {fix_state_name(s)}. Trying again...")
-        return find_polled_winner(s, dem, return_first, weeks_back)
+    return gather_results(polls_counted, dem_total, rows, s, dem, return_first, weeks_back, today)
 
 
 def simulate_election(polling_results, output_filename, electoral_votes_where_we_used_biden_2024, electoral_votes_where_we_used_2020_results):
-    trump_votes = 0
-    harris_votes = 0
-    for state, state_polling_result in polling_results.items():
-        state_winner = state_polling_result['winner']
-        if state_winner == 'Trump':
-            trump_votes += STATE_AND_THEIR_ELECTORAL_VOTES[state.lower()]
-        else:
-            harris_votes += STATE_AND_THEIR_ELECTORAL_VOTES[state.lower()]
+    harris_votes = int(tally_harris_wins(harris_wins(polling_results)))
+    trump_votes = int(tally_harris_wins(states_given(polling_results))) - harris_votes
 
     if trump_votes > harris_votes:
         print(f'Trump wins the election with {trump_votes} electoral votes, where Harris received {harris_votes} votes')
@@ -163,57 +263,148 @@ def simulate_election(polling_results, output_filename, electoral_votes_where_we
     with open(f'{ELECTORAL_VOTE_COUNTS_DIR}/{output_filename}', 'w') as f:
         json.dump(final_counts, f)
 
+    return final_counts
 
-def main():
-    print('Getting polling results for each state...')
 
-    start_time = datetime.now()
+# The exact probability distribution over Harris' electoral votes for the given polling results, treating each state's
+# margin as uncertain rather than handing it to whoever leads (see forecast.py)
+def simulate_election_distribution(polling_results):
+    return electoral_vote_distribution(polling_results)
 
-    polling_results = {}
-
-    electoral_votes_where_we_used_biden_2024 = 0
-    electoral_votes_where_we_used_2020_results = 0
-    for state in STATE_AND_THEIR_ELECTORAL_VOTES.keys():
-
-        used_biden_2024_polling = False
-        used_2020_results = False
-
-        winner, pd = find_polled_winner(state)
-        cur_weeks_back = 1
-        while not winner and cur_weeks_back < 16:
-            print(f"No decisive Harris/Trump polling data found for last {cur_weeks_back} weeks in {fix_state_name(state)}. "
-                  f"Searching the last {cur_weeks_back * 2} weeks.")
-            cur_weeks_back *= 2
-            winner, pd = find_polled_winner(state, weeks_back=cur_weeks_back)
-        if not winner:
-            print(f"No decisive Harris/Trump polling data found for last {cur_weeks_back} weeks in {fix_state_name(state)}. "
-                  f"Searching the last year. Will use numbers from first poll found.")
-            winner, pd = find_polled_winner(state, return_first=True, weeks_back=52)
-
-        if not winner:
-            print(f"No decisive Harris/Trump polling data found for last year in {fix_state_name(state)}.")
-            print(f"Trying Biden instead of Harris, going back one year. Will use numbers from first poll found.")
-            winner, pd = find_polled_winner(state, dem='Biden', return_first=True, weeks_back=52)
-            if winner:
-                used_biden_2024_polling = True
-                electoral_votes_where_we_used_biden_2024 += STATE_AND_THEIR_ELECTORAL_VOTES[state]
-
-        if not winner:
-            past_winner, pd = STATES_AND_2020_OUTCOME[state]
-            print(f'No decisive polling data found for {fix_state_name(state)}. Using 2020 result, where {past_winner} won.')
-            used_2020_results = True
-            winner = 'Harris' if past_winner == 'Biden' else 'Trump'
-            electoral_votes_where_we_used_2020_results += STATE_AND_THEIR_ELECTORAL_VOTES[state]
-
-        polling_result = {
-            'winner': 'Harris' if winner == 'Biden' else winner,
-            'point_diff': pd,
-            'used_biden_2024_polling': used_biden_2024_polling,
-            'used_2020_results': used_2020_results,
-        }
-
-        print(f'Averaged polling data found for {fix_state_name(state)}: {polling_result}')
-        polling_results[state] = polling_result
+
+# The Harris/Trump tiers of the fallback ladder for a single state: the last 1, 2, 4, 8 and 16 weeks of polling, then
+# the first decisive poll from the last year. Returns (None, None) if none of them found a winner.
+def find_harris_winner(state, harris_rows, today):
+    winner, pd = find_polled_winner(state, rows=harris_rows, today=today)
+    cur_weeks_back = 1
+    while not winner and cur_weeks_back < 16:
+        print(f"No decisive Harris/Trump polling data found for last {cur_weeks_back} weeks in {fix_state_name(state)}. "
+              f"Searching the last {cur_weeks_back * 2} weeks.")
+        cur_weeks_back *= 2
+        winner, pd = find_polled_winner(state, weeks_back=cur_weeks_back, rows=harris_rows, today=today)
+    if not winner:
+        print(f"No decisive Harris/Trump polling data found for last {cur_weeks_back} weeks in {fix_state_name(state)}. "
+              f"Searching the last year. Will use numbers from first poll found.")
+        winner, pd = find_polled_winner(state, return_first=True, weeks_back=52, rows=harris_rows, today=today)
+
+    if not winner:
+        print(f"No decisive Harris/Trump polling data found for last year in {fix_state_name(state)}.")
+    return winner, pd
+
+
+# The Biden/Trump tier of the fallback ladder: the first decisive poll from the last year
+def find_biden_winner(state, biden_rows, today):
+    return find_polled_winner(state, dem='Biden', return_first=True, weeks_back=52, rows=biden_rows, today=today)
+
+
+# Build the polling result for a state from the winner found by the ladder (None if no tier found one, in which case
+# the 2020 result is used)
+def make_polling_result(state, winner, pd, used_biden_2024_polling=False):
+    used_2020_results = False
+
+    if not winner:
+        past_winner, pd = STATES_AND_2020_OUTCOME[state]
+        print(f'No decisive polling data found for {fix_state_name(state)}. Using 2020 result, where {past_winner} won.')
+        used_2020_results = True
+        winner = 'Harris' if past_winner == 'Biden' else 'Trump'
+
+    polling_result = {
+        'winner': 'Harris' if winner == 'Biden' else winner,
+        'point_diff': pd,
+        'used_biden_2024_polling': used_biden_2024_polling,
+        'used_2020_results': used_2020_results,
+    }
+
+    print(f'Averaged polling data found for {fix_state_name(state)}: {polling_result}')
+    return polling_result
+
+
+# Run the full fallback ladder for a single state: the Harris/Trump tiers, then Biden/Trump, and finally the 2020
+# result. The state page is loaded once for Harris/Trump, and once more for Biden/Trump only if none of the Harris tiers
+# found a winner.
+def get_state_polling_result(state, driver, today=None, replay=False):
+    if today is None:
+        today = datetime.now().date()
+
+    harris_rows = fetch_poll_rows(state, driver=driver, today=today, replay=replay)
+    winner, pd = find_harris_winner(state, harris_rows, today)
+    if winner:
+        return make_polling_result(state, winner, pd)
+
+    print(f"Trying Biden instead of Harris, going back one year. Will use numbers from first poll found.")
+    biden_rows = fetch_poll_rows(state, dem='Biden', driver=driver, today=today, replay=replay)
+    winner, pd = find_biden_winner(state, biden_rows, today)
+    return make_polling_result(state, winner, pd, used_biden_2024_polling=bool(winner))
+
+
+# Scrape a single state with a browser from the pool. If the browser fails (a stale element, a page that never loads,
+# a crashed Chrome), the browser is dropped from the pool and the state is tried again with a fresh one after an
+# exponentially growing delay, up to SCRAPE_MAX_ATTEMPTS times in total.
+def scrape_state_with_retries(state, driver_pool, today):
+    for attempt in range(1, SCRAPE_MAX_ATTEMPTS + 1):
+        try:
+            with driver_pool.checkout() as driver:
+                return get_state_polling_result(state, driver, today)
+        except WebDriverException as e:
+            if attempt == SCRAPE_MAX_ATTEMPTS:
+                raise
+            delay = min(SCRAPE_BACKOFF_SECONDS * 2 ** (attempt - 1), SCRAPE_MAX_BACKOFF_SECONDS)
+            print(f"{type(e).__name__} while scraping {fix_state_name(state)} (attempt {attempt} of "
+                  f"{SCRAPE_MAX_ATTEMPTS}). Trying again in {delay}s...")
+            time.sleep(delay)
+
+
+def timed_state_polling_result(state, driver_pool, today, replay=False, checkpoint=None):
+    state_start_time = time.perf_counter()
+    if replay:
+        polling_result = get_state_polling_result(state, None, today, replay=True)
+    else:
+        polling_result = scrape_state_with_retries(state, driver_pool, today)
+    if checkpoint is not None:
+        checkpoint.record(state, polling_result)
+    return polling_result, time.perf_counter() - state_start_time
+
+
+# Scrape every state, either one after another (workers=1) or spread across a pool of threads. Each thread checks a
+# browser out of a shared DriverPool for the whole state, so no two threads ever drive the same browser. Results are
+# returned in STATE_AND_THEIR_ELECTORAL_VOTES order regardless of the order in which the states finish. With
+# replay=True the pages saved on the given day are read back instead, and no browser is started. Each finished state is
+# recorded in checkpoint, if given, and states the checkpoint already holds are not scraped again.
+def gather_polling_results(states, workers=1, today=None, replay=False, checkpoint=None):
+    if today is None:
+        today = datetime.now().date()
+
+    results = {}
+    remaining_states = states
+    if checkpoint is not None and checkpoint.done:
+        remaining_states = [state for state in states if state not in checkpoint.done]
+        print(f"Resuming from checkpoint: {len(states) - len(remaining_states)} states already done, "
+              f"{len(remaining_states)} left to scrape")
+
+    with (nullcontext() if replay else DriverPool(max(workers, 1))) as driver_pool:
+        if workers <= 1:
+            for state in remaining_states:
+                results[state] = timed_state_polling_result(state, driver_pool, today, replay, checkpoint)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(timed_state_polling_result, state, driver_pool, today, replay, checkpoint):
+                           state for state in remaining_states}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+
+    polling_results = {state: results[state][0] if state in results else checkpoint.done[state] for state in states}
+    state_timings = {state: results[state][1] for state in remaining_states}
+    return polling_results, state_timings
+
+
+# Write a finished day's polling results and the simulated election outcome for it
+def save_results(polling_results, run_date):
+    electoral_votes_where_we_used_biden_2024 = sum(
+        STATE_AND_THEIR_ELECTORAL_VOTES[state] for state, result in polling_results.items()
+        if result['used_biden_2024_polling'])
+    electoral_votes_where_we_used_2020_results = sum(
+        STATE_AND_THEIR_ELECTORAL_VOTES[state] for state, result in polling_results.items()
+        if result['used_2020_results'])
 
     print(
         f"Polling results, where\n"
@@ -222,10 +413,10 @@ def main():
     )
     pprint(polling_results)
 
-    with open(f'{POLLING_RESULTS_DIR}/polling_results_{start_time.strftime("%Y-%m-%d")}.json', 'w') as f:
+    with open(f'{POLLING_RESULTS_DIR}/polling_results_{run_date.strftime("%Y-%m-%d")}.json', 'w') as f:
         json.dump(polling_results, f)
 
-    print(f"Polling results saved to polling_results_{start_time.strftime('%Y-%m-%d')}.json")
+    print(f"Polling results saved to polling_results_{run_date.strftime('%Y-%m-%d')}.json")
 
     # using polling_results, count up how many electoral votes each candidate would get if the election were held with
     # those results to simulate the election. Print out the winner of the election and the number of electoral votes they
@@ -233,13 +424,58 @@ def main():
 
     print('Simulating the election...')
 
-    electoral_votes_filename = f'electoral_votes_{start_time.strftime("%Y-%m-%d")}.json'
-    simulate_election(polling_results, electoral_votes_filename, electoral_votes_where_we_used_biden_2024, electoral_votes_where_we_used_2020_results)
+    electoral_votes_filename = f'electoral_votes_{run_date.strftime("%Y-%m-%d")}.json'
+    electoral_votes = simulate_election(polling_results, electoral_votes_filename,
+                                        electoral_votes_where_we_used_biden_2024,
+                                        electoral_votes_where_we_used_2020_results)
 
     print(f"Electoral votes saved to {electoral_votes_filename}")
 
+    append_day(run_date.strftime('%Y-%m-%d'), polling_results, electoral_votes)
+
+
+def print_state_timings(state_timings):
+    print('Time taken per state:')
+    for state, seconds in sorted(state_timings.items(), key=lambda item: item[1], reverse=True):
+        print(f'  {fix_state_name(state)}: {seconds:.1f}s')
+
+
+# Scrape today's polling for every state and simulate the election. Pass replay_date (YYYY-MM-DD) to rebuild that
+# day's results from the pages saved when it was scraped instead.
+def main(workers=SCRAPE_WORKERS, replay_date=None):
+    start_time = datetime.now()
+    run_date = datetime.strptime(replay_date, '%Y-%m-%d').date() if replay_date else start_time.date()
+
+    if replay_date and not load_index(replay_date):
+        print(f'No pages were saved on {replay_date}, so there is nothing to replay')
+        return
+
+    if replay_date:
+        print(f'Replaying polling results for each state from pages saved on {replay_date}...')
+    else:
+        print(f'Getting polling results for each state using {workers} worker{"" if workers == 1 else "s"}...')
+
+    # a replay takes seconds, so only a live scrape is checkpointed
+    checkpoint = None if replay_date else StateCheckpoint(run_date.strftime('%Y-%m-%d'))
+
+    polling_results, state_timings = gather_polling_results(list(STATE_AND_THEIR_ELECTORAL_VOTES.keys()), workers,
+                                                            run_date, replay=bool(replay_date), checkpoint=checkpoint)
+
+    print_state_timings(state_timings)
+
+    save_results(polling_results, run_date)
+
+    if checkpoint is not None:
+        checkpoint.clear()
+
     print(f"Time taken: {datetime.now() - start_time}")
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Scrape state polling from 538 and simulate the election.')
+    parser.add_argument('--workers', type=int, default=SCRAPE_WORKERS,
+                        help='number of states to scrape in parallel (1 scrapes serially)')
+    parser.add_argument('--replay', metavar='YYYY-MM-DD',
+                        help='rebuild the results for a past day from its saved pages, without a browser')
+    args = parser.parse_args()
+    main(workers=args.workers, replay_date=args.replay)
@@ -0,0 +1,116 @@
+# the US state outlines map.py draws, with Hawaii and Alaska moved and resized to sit under the lower 48.
+#
+# Reading the shapefile and applying those transforms is done once per shapefile: the result is written to
+# GEOMETRY_CACHE_DIR as WKB in an .npz file named after a hash of the shapefile, and kept in memory for the rest of the
+# process, so animate_map.py calling map.main once per pair of days only pays for it the first time.
+#
+# Run with: python us_geometry.py [--rebuild]
+
+import argparse
+import hashlib
+import io
+import os
+import time
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.affinity import scale, translate
+
+from atomic_file import atomic_write
+
+from constants import SOURCE_IMAGES_DIR, GEOMETRY_CACHE_DIR
+
+SHAPEFILE = os.path.join(SOURCE_IMAGES_DIR, 'States_shapefile.shp')
+SHAPEFILE_PARTS = [f'{SHAPEFILE[:-len(".shp")]}.{ext}' for ext in ('shp', 'shx', 'dbf', 'prj', 'cpg')]
+
+# bump this whenever project_us_states changes, so geometry cached by the old version is not used
+TRANSFORM_VERSION = 1
+
+_loaded = {}  # cache file path -> GeoDataFrame, for the life of the process
+
+
+def shapefile_hash():
+    digest = hashlib.sha256(f'transform {TRANSFORM_VERSION}'.encode())
+    for path in SHAPEFILE_PARTS:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def cache_path(digest):
+    return os.path.join(GEOMETRY_CACHE_DIR, f'us_states_{digest[:16]}.npz')
+
+
+# Move Hawaii next to Texas and shrink Alaska about its bottom right corner, in place
+def project_us_states(us_states):
+    # Translate Hawaii
+    us_states.loc[us_states['State_Name'] == 'HAWAII', 'geometry'] = us_states.loc[
+        us_states['State_Name'] == 'HAWAII', 'geometry'].apply(lambda geom: translate(geom, xoff=15, yoff=5))
+
+    # Get the bounds of Alaska
+    alaska_bounds = us_states.loc[us_states['State_Name'] == 'ALASKA', 'geometry'].bounds
+
+    # Get the bottom right corner of Alaska
+    alaska_bottom_right = (alaska_bounds['maxx'].values[0], alaska_bounds['miny'].values[0])
+
+    # Scale Alaska
+    us_states.loc[us_states['State_Name'] == 'ALASKA', 'geometry'] = us_states.loc[
+        us_states['State_Name'] == 'ALASKA', 'geometry'].apply(
+        lambda geom: scale(geom, xfact=0.5, yfact=0.5, origin=alaska_bottom_right))
+    us_states.loc[us_states['State_Name'] == 'HAWAII', 'geometry'] = us_states.loc[
+        us_states['State_Name'] == 'HAWAII', 'geometry'].apply(
+        lambda geom: scale(geom, xfact=1.2, yfact=1.2, origin='center'))
+    return us_states
+
+
+# The WKB of every state is stored back to back in one byte array, with offsets marking where each one starts
+def save_geometry(path, us_states):
+    wkb = shapely.to_wkb(us_states.geometry.values, output_dimension=2)
+    offsets = np.cumsum([0] + [len(b) for b in wkb])
+    buffer = io.BytesIO()
+    np.savez(buffer,
+             names=np.array(us_states['State_Name'], dtype=str),
+             wkb=np.frombuffer(b''.join(wkb), dtype=np.uint8),
+             offsets=offsets,
+             crs=np.array(us_states.crs.to_wkt() if us_states.crs else ''))
+    atomic_write(path, buffer.getvalue())
+
+
+def read_geometry(path):
+    with np.load(path) as data:
+        wkb = data['wkb'].tobytes()
+        offsets = data['offsets']
+        geometry = shapely.from_wkb([wkb[start:end] for start, end in zip(offsets[:-1], offsets[1:])])
+        crs = str(data['crs']) or None
+        return gpd.GeoDataFrame({'State_Name': data['names']}, geometry=geometry, crs=crs)
+
+
+def build_geometry(path):
+    us_states = project_us_states(gpd.read_file(SHAPEFILE))[['State_Name', 'geometry']]
+    save_geometry(path, us_states)
+    return us_states
+
+
+# The projected states as a GeoDataFrame with State_Name and geometry columns. The same frame is returned to every
+# caller in the process, so don't modify it in place.
+def load_us_states(rebuild=False):
+    path = cache_path(shapefile_hash())
+    if rebuild:
+        _loaded.pop(path, None)
+    if path not in _loaded:
+        if rebuild or not os.path.exists(path):
+            _loaded[path] = build_geometry(path)
+        else:
+            _loaded[path] = read_geometry(path)
+    return _loaded[path]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the cached US state geometry map.py draws.')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the cache even if it is up to date')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    us_states = load_us_states(args.rebuild)
+    print(f'{len(us_states)} states in {cache_path(shapefile_hash())} ({time.perf_counter() - start:.3f}s)')
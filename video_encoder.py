@@ -0,0 +1,86 @@
+# encodes frames straight into an H.264 MP4 by piping them raw into ffmpeg's stdin, so a video is encoded once with no
+# intermediate file. Used by animate_map.py and plot.py.
+#
+# The ffmpeg binary and the encoder settings come from the FFMPEG_* constants. The video is written next to its final
+# path and moved into place once ffmpeg has finished, so a failed or interrupted encode never leaves half a video.
+
+import os
+import shutil
+import subprocess
+import time
+
+from atomic_file import AtomicPath
+from constants import FFMPEG_PATH, FFMPEG_CODEC, FFMPEG_PRESET, FFMPEG_CRF, FFMPEG_EXTRA_ARGS
+
+
+def ffmpeg_binary(ffmpeg_path=FFMPEG_PATH):
+    if os.path.isfile(ffmpeg_path):
+        return ffmpeg_path
+    found = shutil.which(ffmpeg_path) or shutil.which('ffmpeg')
+    if found is None:
+        raise FileNotFoundError(f'ffmpeg not found at {ffmpeg_path} or on PATH; set FFMPEG_PATH in constants.py')
+    return found
+
+
+class VideoEncoder:
+
+    # size: (width, height) of every frame. pixel_format: how the frames' bytes are laid out, e.g. 'bgr24' for OpenCV
+    # images or 'rgba' for a matplotlib canvas.
+    def __init__(self, path, size, fps, pixel_format='bgr24', ffmpeg_path=FFMPEG_PATH, codec=FFMPEG_CODEC,
+                 preset=FFMPEG_PRESET, crf=FFMPEG_CRF, extra_args=FFMPEG_EXTRA_ARGS):
+        self.path = path
+        self.size = tuple(size)
+        self.frames = 0
+        self.waiting = 0.0  # seconds spent blocked on ffmpeg taking frames
+
+        self.output = AtomicPath(path, suffix='.mp4')
+
+        width, height = self.size
+        command = [
+            ffmpeg_binary(ffmpeg_path), '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', pixel_format, '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+            '-an', '-c:v', codec, '-preset', preset, '-crf', str(crf),
+            # H.264 in yuv420p needs even dimensions
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+            *extra_args, self.output.tmp_path,
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.started = time.perf_counter()
+
+    # frame: a height x width x channels uint8 array in the pixel format given to __init__
+    def write(self, frame):
+        if frame.shape[1::-1] != self.size:
+            raise ValueError(f'frame is {frame.shape[1]}x{frame.shape[0]}, expected {self.size[0]}x{self.size[1]}')
+        start = time.perf_counter()
+        self.process.stdin.write(memoryview(frame.data) if frame.flags.c_contiguous else frame.tobytes())
+        self.waiting += time.perf_counter() - start
+        self.frames += 1
+
+    def close(self):
+        start = time.perf_counter()
+        self.process.stdin.close()
+        return_code = self.process.wait()
+        self.waiting += time.perf_counter() - start
+        if return_code != 0:
+            self.discard()
+            raise subprocess.CalledProcessError(return_code, self.process.args)
+        self.output.commit()
+
+        elapsed = time.perf_counter() - self.started
+        print(f'Encoded {self.frames} frames to {self.path} in {elapsed:.1f}s ({self.frames / elapsed:.0f} frames/s, '
+              f'{self.waiting:.1f}s of it waiting on ffmpeg)')
+
+    def discard(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.output.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
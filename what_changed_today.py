@@ -1,80 +1,62 @@
-import json
-from constants import POLLING_RESULTS_DIR, ELECTORAL_VOTE_COUNTS_DIR
-import os
-
+from changelog import compute_changes
+from history_store import load_history
 from map import write_out_date
 from simulate import fix_state_name
 
-PD_DIFF_THRESHOLD = 0.5
-
-# get the two newest polling results
-
-fn1 = sorted([f for f in os.listdir(POLLING_RESULTS_DIR) if f.endswith('.json')])[-1]
-fn2 = sorted([f for f in os.listdir(POLLING_RESULTS_DIR) if f.endswith('.json')])[-2]
-
+# the lines printed under a state's change when where its result came from changed too
+SOURCE_SWITCH_LINES = {
+    ('2020_results', 'biden_2024_polling'): '- after switching from using 2020 results to using Biden\'s 2024 polling',
+    ('biden_2024_polling', '2020_results'): '- after switching from using Biden\'s 2024 polling to using 2020 results',
+    ('biden_2024_polling', 'harris_2024_polling'): '- after switching from using Biden\'s 2024 polling to Harris\'',
+    ('2020_results', 'harris_2024_polling'): '- after switching from using 2020 results to Harris\' 2024 polling',
+    ('interpolated', 'harris_2024_polling'): '- after switching from an interpolated result to Harris\' 2024 polling',
+    ('interpolated', 'biden_2024_polling'): '- after switching from an interpolated result to Biden\'s 2024 polling',
+    ('interpolated', '2020_results'): '- after switching from an interpolated result to 2020 results',
+    ('harris_2024_polling', 'interpolated'): '- after switching from Harris\' 2024 polling to an interpolated result',
+    ('biden_2024_polling', 'interpolated'): '- after switching from Biden\'s 2024 polling to an interpolated result',
+    ('2020_results', 'interpolated'): '- after switching from 2020 results to an interpolated result',
+}
 
-with (open(os.path.join(POLLING_RESULTS_DIR, fn1), 'r') as f):
-    p2 = json.load(f)
-with (open(os.path.join(POLLING_RESULTS_DIR, fn2), 'r') as f):
-    p1 = json.load(f)
+# get the changes between the two newest days
 
-# get the two newest electoral vote counts
+history = load_history()
+date1 = history.dates[-1]
+date2 = history.dates[-2]
 
-fn1 = sorted([f for f in os.listdir(ELECTORAL_VOTE_COUNTS_DIR) if f.endswith('.json')])[-1]
-fn2 = sorted([f for f in os.listdir(ELECTORAL_VOTE_COUNTS_DIR) if f.endswith('.json')])[-2]
-
-with (open(os.path.join(ELECTORAL_VOTE_COUNTS_DIR, fn1), 'r') as f):
-    e2 = json.load(f)
-with (open(os.path.join(ELECTORAL_VOTE_COUNTS_DIR, fn2), 'r') as f):
-    e1 = json.load(f)
-
-date1 = fn1.split('.')[0].split('_')[-1]
-date2 = fn2.split('.')[0].split('_')[-1]
+changes = compute_changes(history, start=date2, end=date1)
+e2 = history.electoral_votes(date1)
+e1 = history.electoral_votes(date2)
 
 
 def fix_point_diff(pd):
     return f'{pd:.1f}' if pd % 1 else f'{int(pd)}'
 
 
-print(f'Comparing polling and election simulation results from dates {write_out_date(date2)} and {write_out_date(date1)}'
-      f'\n')
-
-for state in p1:
-
-    winner1 = p1[state]['winner']
-    winner2 = p2[state]['winner']
-
-    old_pd = p1[state]['point_diff']
-    new_pd = p2[state]['point_diff']
-
-    printed_result = False
+def possessive(winner):
+    return f"{winner}'{'' if winner == 'Harris' else 's'}"
 
-    if winner1 != winner2:
-        print(f'{fix_state_name(state)} changed from {winner1} (with a {fix_point_diff(old_pd)} point lead) to {winner2} (with a {fix_point_diff(new_pd)} point lead)')
-        printed_result = True
-    elif old_pd > new_pd and (old_pd - new_pd)/old_pd > PD_DIFF_THRESHOLD:  # check for significant lead drops
-        print(f"{winner1}'{'' if winner1 == 'Harris' else 's'} lead in {fix_state_name(state)} drops from {fix_point_diff(old_pd)} to {fix_point_diff(new_pd)}")
-        printed_result = True
-    elif old_pd < new_pd and (new_pd - old_pd)/old_pd > PD_DIFF_THRESHOLD:
-        print(f"{winner1}'{'' if winner1 == 'Harris' else 's'} lead in {fix_state_name(state)} increases from {fix_point_diff(old_pd)} to {fix_point_diff(new_pd)}")
-        printed_result = True
 
-    if not printed_result:
-        continue
-
-    old_used_biden = p1[state]['used_biden_2024_polling']
-    old_used_2020 = p1[state]['used_2020_results']
-    new_used_biden = p2[state]['used_biden_2024_polling']
-    new_used_2020 = p2[state]['used_2020_results']
+print(f'Comparing polling and election simulation results from dates {write_out_date(date2)} and {write_out_date(date1)}'
+      f'\n')
 
-    if old_used_2020 and not new_used_2020 and new_used_biden and not old_used_biden:
-        print('- after switching from using 2020 results to using Biden\'s 2024 polling')
-    elif old_used_biden and not new_used_biden and new_used_2020 and not old_used_2020:
-        print('- after switching from using Biden\'s 2024 polling to using 2020 results')
-    elif old_used_biden and not new_used_biden and not new_used_2020 and not old_used_2020:
-        print('- after switching from using Biden\'s 2024 polling to Harris\'')
-    elif old_used_2020 and not new_used_2020 and not new_used_biden and not old_used_biden:
-        print('- after switching from using 2020 results to Harris\' 2024 polling')
+printed_states = set()
+for change in changes:
+    state = change.get('state')
+    old_pd, new_pd = change.get('from_point_diff'), change.get('to_point_diff')
+
+    if change['type'] == 'winner_flip':
+        print(f'{fix_state_name(state)} changed from {change["from_winner"]} (with a {fix_point_diff(old_pd)} point lead) to {change["to_winner"]} (with a {fix_point_diff(new_pd)} point lead)')
+        printed_states.add(state)
+    elif change['type'] == 'lead_drop':
+        print(f"{possessive(change['winner'])} lead in {fix_state_name(state)} drops from {fix_point_diff(old_pd)} to {fix_point_diff(new_pd)}")
+        printed_states.add(state)
+    elif change['type'] == 'lead_increase':
+        print(f"{possessive(change['winner'])} lead in {fix_state_name(state)} increases from {fix_point_diff(old_pd)} to {fix_point_diff(new_pd)}")
+        printed_states.add(state)
+    elif change['type'] == 'source_switch' and state in printed_states:
+        line = SOURCE_SWITCH_LINES.get((change['from_source'], change['to_source']))
+        if line:
+            print(line)
 
 print('')
 
@@ -102,8 +84,6 @@ if old_trump_count != new_trump_count:
 if old_harris_count == new_harris_count and old_trump_count == new_trump_count:
     print('No changes in overall electoral vote counts')
 
-old_winner = 'Harris' if old_harris_count > old_trump_count else 'Trump'
-new_winner = 'Harris' if new_harris_count > new_trump_count else 'Trump'
-
-if old_winner != new_winner:
-    print(f"The overall winner changed from {old_winner} to {new_winner}")
+for change in changes:
+    if change['type'] == 'overall_winner_flip':
+        print(f"The overall winner changed from {change['from_winner']} to {change['to_winner']}")